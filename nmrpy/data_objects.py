@@ -1,13 +1,28 @@
 import numpy
 import scipy
+import scipy.fft
+import scipy.linalg
+import scipy.ndimage
 from matplotlib import pyplot
 import lmfit
 import nmrglue
 import numbers
 from scipy.optimize import leastsq
-from multiprocessing import Pool, cpu_count
+from multiprocessing import Pool, cpu_count, shared_memory
 from nmrpy.plotting import *
 import pickle
+import os
+import shutil
+import tempfile
+import weakref
+import glob
+import time
+import datetime
+import concurrent.futures
+import hashlib
+import inspect
+import collections
+import re
 
 class Base():
     _complex_dtypes = [
@@ -18,6 +33,12 @@ class Base():
 
     _file_formats = ['varian', 'bruker', None]
 
+    # complex and real dtypes in which data are stored at each precision
+    _precisions = {
+                    'double': (numpy.dtype('cdouble'), numpy.dtype('double')),
+                    'single': (numpy.dtype('csingle'), numpy.dtype('single')),
+                    }
+
     def __init__(self, *args, **kwargs):
         self.id = kwargs.get('id', None)
         self._procpar = kwargs.get('procpar', None)
@@ -58,6 +79,19 @@ class Base():
         else:
             raise AttributeError('_file_format must be "varian", "bruker", or None.')
 
+    @classmethod
+    def _float_dtype(cls, dtype, precision):
+        """
+        Return the complex or real floating-point dtype corresponding to dtype at
+        the given precision, or None if dtype is not floating-point.
+        """
+        complex_dtype, real_dtype = cls._precisions[precision]
+        if dtype.kind == 'c':
+            return complex_dtype
+        elif dtype.kind == 'f':
+            return real_dtype
+        return None
+
     @classmethod
     def _is_iter(cls, i):
         try:
@@ -66,10 +100,20 @@ class Base():
         except TypeError:
             return False
 
+    @classmethod
+    def _is_numeric_array(cls, i):
+        """
+        Return True if i is an ndarray of numbers, which can then be validated from
+        its dtype and shape rather than element by element.
+        """
+        return isinstance(i, numpy.ndarray) and i.dtype.kind in 'iufc'
+
     @classmethod
     def _is_iter_of_iters(cls, i):
         if type(i) == list and len(i) == 0:
             return False
+        elif cls._is_numeric_array(i):
+            return i.ndim > 1 or i.size == 0
         elif cls._is_iter(i) and all(cls._is_iter(j) for j in i):
             return True
         return False
@@ -78,10 +122,21 @@ class Base():
     def _is_flat_iter(cls, i):
         if type(i) == list and len(i) == 0:
             return True
+        elif cls._is_numeric_array(i):
+            return i.ndim == 1
         elif cls._is_iter(i) and not any(cls._is_iter(j) for j in i):
             return True
         return False
 
+    @classmethod
+    def _all_numbers(cls, i):
+        """
+        Return True if all elements of the iterable i are numbers.
+        """
+        if cls._is_numeric_array(i):
+            return True
+        return all(isinstance(j, numbers.Number) for j in i)
+
     @property
     def _procpar(self):
         return self.__procpar
@@ -96,6 +151,15 @@ class Base():
         else:
             raise AttributeError('procpar must be a dictionary or None.')
 
+    def _share_procpar(self, other):
+        """
+        Use the acquisition parameters of other, by reference, instead of parsing
+        them again. Objects acquired in the same experiment share a single
+        :class:`~nmrpy.data_objects.AcquisitionParameters` instance.
+        """
+        self.__procpar = other._procpar
+        self._params = other._params
+
     @property
     def _params(self):
         return self.__params
@@ -110,9 +174,9 @@ class Base():
     #processing
     def _extract_procpar(self, procpar):
         if self._file_format == 'bruker':
-            return self._extract_procpar_bruker(procpar, self.fid_path)
+            return AcquisitionParameters(self._extract_procpar_bruker(procpar, self.fid_path))
         elif self._file_format == 'varian':
-            return self._extract_procpar_varian(procpar)
+            return AcquisitionParameters(self._extract_procpar_varian(procpar))
         #else:
         #    raise AttributeError('Could not parse procpar.') 
 
@@ -186,12 +250,100 @@ class Base():
             sw_hz=sw_hz)
         return params
 
+class AcquisitionParameters(dict):
+    """
+    Commonly-used acquisition parameters extracted from a procpar/acqus file, e.g.
+    ``params['sw_hz']`` or ``params.sw_hz``. Parameters are parsed once per
+    experiment and the same instance is shared by all of its
+    :class:`~nmrpy.data_objects.Fid` objects, so it cannot be modified.
+    """
+
+    def __init__(self, params):
+        params = dict(params)
+        for key, value in params.items():
+            if isinstance(value, numpy.ndarray):
+                value = value.copy()
+                value.flags.writeable = False
+                params[key] = value
+        super().__init__(params)
+
+    def __getattr__(self, key):
+        try:
+            return self[key]
+        except KeyError:
+            raise AttributeError(key)
+
+    def __reduce__(self):
+        return (self.__class__, (dict(self),))
+
+    def _immutable(self, *args, **kwargs):
+        raise TypeError('AcquisitionParameters cannot be modified.')
+
+    __setitem__ = __delitem__ = _immutable
+    clear = pop = popitem = setdefault = update = __ior__ = _immutable
+
+class _VectorCache():
+    """
+    In-memory least-recently-used cache of read-only arrays, such as apodisation
+    windows, that are shared by the FIDs of an array and by repeated calls. The
+    cache is bounded by the total size of the arrays in bytes.
+    """
+
+    def __init__(self, max_bytes):
+        """
+        Keyword arguments:
+        max_bytes -- maximum total size of the cached arrays
+        """
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self._entries = collections.OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, build):
+        """
+        Return the array cached under key, calling build() to create it on a
+        miss. Arrays larger than max_bytes are returned without being cached.
+
+        Keyword arguments:
+        key -- hashable key
+        build -- function of no arguments returning the array
+        """
+        array = self._entries.get(key)
+        if array is not None:
+            self._entries.move_to_end(key)
+            return array
+        array = build()
+        array.setflags(write=False)
+        if array.nbytes <= self.max_bytes:
+            self._entries[key] = array
+            self.nbytes += array.nbytes
+            while self.nbytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.nbytes -= evicted.nbytes
+        return array
+
+    def clear(self):
+        self._entries.clear()
+        self.nbytes = 0
+
 class Fid(Base):
     '''
     The basic FID (Free Induction Decay) class contains all the data for a single spectrum (:attr:`~nmrpy.data_objects.Fid.data`), and the
     necessary methods to process these data.
     '''    
 
+    _data_loader = None
+    _precision = 'double'
+    # position of this FID in the experiment it was imported from, if known
+    _source_index = None
+    # names of the stored fields modified since the last save, see FidArray.save_to_file
+    _dirty = frozenset()
+    # apodisation windows and phase-correction vectors kept in memory, at most 64 MiB
+    _vector_cache = _VectorCache(2**26)
+    _apodisation_windows = ['exponential', 'gaussian', 'sine', 'trapezoid']
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.data = kwargs.get('data', [])
@@ -206,17 +358,92 @@ class Fid(Base):
     def __str__(self):
         return 'FID: %s (%i data)'%(self.id, len(self.data))
 
+    def __getstate__(self):
+        # lazily-imported data are read before pickling, as the loader holds a
+        # memory map of the source file
+        self.data
+        state = self.__dict__.copy()
+        state.pop('_data_loader', None)
+        return state
+
     @property
     def data(self):
         """
         The spectral data. This is the primary object upon which the processing and analysis functions work.
+
+        FIDs imported with ``lazy=True`` are read from disk on first access.
         """
+        if self._data_loader is not None:
+            loader, self._data_loader = self._data_loader, None
+            self.data = loader()
         return self.__data
     
     @data.setter    
     def data(self, data):
         if Fid._is_valid_dataset(data):
-            self.__data = numpy.array(data)
+            self.__data = numpy.array(data, dtype=self._precision_dtype(data))
+            self._data_loader = None
+            self._mark_dirty('data')
+
+    def _bind_data(self, data, dirty=True):
+        """
+        Point :attr:`~nmrpy.data_objects.Fid.data` at an existing array without
+        validating or copying it. Used by :class:`~nmrpy.data_objects.FidArray` to
+        share rows of its data block.
+
+        Keyword arguments:
+        data -- the array to use
+        dirty -- whether the data differ from those last saved (True)
+        """
+        self.__data = data
+        self._data_loader = None
+        if dirty:
+            self._mark_dirty('data')
+
+    @property
+    def precision(self):
+        """
+        Floating-point precision in which :attr:`~nmrpy.data_objects.Fid.data` are
+        stored: 'double' (complex128/float64, the default) or 'single'
+        (complex64/float32). At single precision, data assigned to the FID are
+        converted, and processing keeps them at single precision; fitting is still
+        performed at double precision.
+        """
+        return self._precision
+
+    @precision.setter
+    def precision(self, precision):
+        if precision not in self._precisions:
+            raise ValueError('precision must be "single" or "double".')
+        self._precision = precision
+        # lazily-imported data are converted when they are read
+        if self._data_loader is None:
+            dtype = self._float_dtype(self.__data.dtype, precision)
+            if dtype is not None and dtype != self.__data.dtype:
+                self.data = numpy.asarray(self.__data, dtype=dtype)
+
+    def _precision_dtype(self, data):
+        """
+        Return the dtype in which data are stored at the current precision, or
+        None if they are stored as given (at double precision, or for
+        non-numeric data).
+        """
+        if self._precision == 'double':
+            return None
+        kind = numpy.asarray(data).dtype.kind
+        complex_dtype, real_dtype = self._precisions[self._precision]
+        if kind == 'c':
+            return complex_dtype
+        elif kind in 'fiub':
+            return real_dtype
+        return None
+
+    def _mark_dirty(self, *fields):
+        """
+        Record that fields have changed since the last save, so that an incremental
+        :meth:`~nmrpy.data_objects.FidArray.save_to_file` rewrites them.
+        """
+        self._dirty = self._dirty.union(fields)
 
     @property
     def _ppm(self):
@@ -240,11 +467,12 @@ class Fid(Base):
         if peaks is not None:
             if not Fid._is_flat_iter(peaks):
                 raise AttributeError('peaks must be a flat iterable')
-            if not all(isinstance(i, numbers.Number) for i in peaks):
+            if not Fid._all_numbers(peaks):
                 raise AttributeError('peaks must be numbers')
             self._peaks = numpy.array(peaks)
         else:
             self._peaks = peaks
+        self._mark_dirty('peaks')
 
     @property
     def ranges(self):
@@ -255,6 +483,7 @@ class Fid(Base):
     
     @ranges.setter    
     def ranges(self, ranges):
+        self._mark_dirty('ranges')
         if ranges is None:
             self._ranges = None
             return
@@ -263,9 +492,8 @@ class Fid(Base):
         ranges = numpy.array(ranges)
         if ranges.shape[1] != 2:
             raise AttributeError('ranges must be an iterable of 2-length iterables or an empty iterables e.g. [[]]')
-        for r in ranges:
-            if not all(isinstance(i, numbers.Number) for i in r):
-                raise AttributeError('ranges must be numbers')
+        if not all(Fid._all_numbers(r) for r in ranges):
+            raise AttributeError('ranges must be numbers')
         self._ranges = ranges
 
     @property
@@ -278,18 +506,21 @@ class Fid(Base):
             if not Fid._is_flat_iter(bl_ppm):
                 raise AttributeError('baseline indices must be a flat iterable')
             if len(bl_ppm) > 0:
-                if not all(isinstance(i, numbers.Number) for i in bl_ppm):
+                if not Fid._all_numbers(bl_ppm):
                     raise AttributeError('baseline indices must be numbers')
                 self.__bl_ppm = numpy.sort(list(set(bl_ppm)))[::-1]
             else:
                 self.__bl_ppm = None
         else:
             self.__bl_ppm = bl_ppm
+        self._mark_dirty('bl_ppm')
 
     @property
     def _bl_indices(self):
         if self._bl_ppm is not None:
-            return self._conv_to_index(self.data, self._bl_ppm, self._params['sw_left'], self._params['sw'])
+            indices = self._conv_to_index(self.data, self._bl_ppm, self._params['sw_left'], self._params['sw'])
+            # the rightmost point of the spectrum converts to one past the end
+            return numpy.minimum(indices, len(self.data)-1)
         else:
             return None
 
@@ -302,11 +533,12 @@ class Fid(Base):
         if bl_poly is not None:
             if not Fid._is_flat_iter(bl_poly):
                 raise AttributeError('baseline polynomial must be a flat iterable')
-            if not all(isinstance(i, numbers.Number) for i in bl_poly):
+            if not Fid._all_numbers(bl_poly):
                 raise AttributeError('baseline polynomial must be numbers')
             self.__bl_poly = numpy.array(bl_poly)
         else:
-            self.__bl_ppm = bl_poly
+            self.__bl_poly = bl_poly
+        self._mark_dirty('bl_poly')
 
     @property
     def _index_peaks(self):
@@ -370,6 +602,7 @@ class Fid(Base):
             frac_gauss: fraction of peak to be Gaussian (Lorentzian fraction is 1-frac_gauss)
          """
         self.__deconvoluted_peaks = deconvoluted_peaks 
+        self._mark_dirty('deconvoluted_peaks')
 
     @property
     def deconvoluted_integrals(self):
@@ -408,7 +641,7 @@ class Fid(Base):
             raise TypeError('Data must be an iterable.')
         if not cls._is_flat_iter(data):
             raise TypeError('Data must not be nested.')
-        if not all(isinstance(i, numbers.Number) for i in data):
+        if not cls._all_numbers(data):
             raise TypeError('Data must consist of numbers only.')
         return True 
         
@@ -436,7 +669,10 @@ class Fid(Base):
         in an artificially increased resolution once Fourier-transformed.
 
         """
-        self.data = numpy.append(self.data, 0*self.data)
+        data = self.data
+        zero_filled = numpy.zeros(2*len(data), dtype=data.dtype)
+        zero_filled[:len(data)] = data
+        self._bind_data(zero_filled)
 
     def emhz(self, lb=5.0):
         """
@@ -447,7 +683,175 @@ class Fid(Base):
         :keyword lb: degree of line-broadening in Hz.
 
         """
-        self.data = numpy.exp(-numpy.pi*numpy.arange(len(self.data)) * (lb/self._params['sw_hz'])) * self.data
+        data = self.data
+        self._multiply_data(Fid._emhz_window(len(data), lb, self._params['sw_hz'], data.dtype))
+
+    def apodise(self, window='exponential', **kwargs):
+        """
+
+        Multiply :attr:`~nmrpy.data_objects.Fid.data` by an apodisation window.
+        With t the acquisition time (in s) of each point and x its fractional
+        position from 0 (first point) to 1 (last point), the windows are:
+
+            exponential: exp(-pi*lb*t)
+
+            gaussian: Lorentz-to-Gauss transformation, exp(pi*lb*t)*exp(-(pi*gb*t)**2/(4*ln(2)))
+
+            sine: sin(pi*(off+(end-off)*x))**power, a sine-bell for the default
+            off=0.0, end=1.0 and power=1; off=0.5 and power=2 give a squared cosine
+
+            trapezoid: rises linearly over the first 'rise' points and falls
+            linearly over the last 'fall' points
+
+        :keyword window: one of 'exponential', 'gaussian', 'sine' or 'trapezoid'
+
+        :keyword lb: 'exponential': degree of line-broadening in Hz (5.0); 'gaussian': Lorentzian line-width removed in Hz (0.0)
+
+        :keyword gb: 'gaussian': Gaussian line-width introduced in Hz (5.0)
+
+        :keyword off: 'sine': starting phase of the sine, as a fraction of pi (0.0)
+
+        :keyword end: 'sine': ending phase of the sine, as a fraction of pi (1.0)
+
+        :keyword power: 'sine': exponent of the sine (1)
+
+        :keyword rise: 'trapezoid': number of points of the rising edge (0)
+
+        :keyword fall: 'trapezoid': number of points of the falling edge (0)
+        """
+        data = self.data
+        self._multiply_data(Fid._apodisation_window(window, len(data), self._params['sw_hz'], data.dtype, **kwargs))
+
+    @staticmethod
+    def _exponential_window(t, x, lb=5.0):
+        return numpy.exp(-numpy.pi*lb*t)
+
+    @staticmethod
+    def _gaussian_window(t, x, lb=0.0, gb=5.0):
+        return numpy.exp(numpy.pi*lb*t - (numpy.pi*gb*t)**2/(4*numpy.log(2)))
+
+    @staticmethod
+    def _sine_window(t, x, off=0.0, end=1.0, power=1):
+        return numpy.sin(numpy.pi*(off+(end-off)*x))**power
+
+    @staticmethod
+    def _trapezoid_window(t, x, rise=0, fall=0):
+        size = len(x)
+        if not all(isinstance(i, numbers.Integral) and 0 <= i <= size for i in [rise, fall]) or rise+fall > size:
+            raise ValueError('rise and fall must be non-negative numbers of points that fit within the data.')
+        window = numpy.ones(size)
+        window[:rise] = numpy.arange(1, rise+1)/rise
+        window[size-fall:] = numpy.arange(fall, 0, -1)/fall
+        return window
+
+    @staticmethod
+    def _window_params(window, kwargs):
+        """
+        Check that window names an apodisation window accepting kwargs, and return
+        its full parameters (including defaults) as a sorted tuple of items.
+
+        Keyword arguments:
+        window -- window name, see :meth:`~nmrpy.data_objects.Fid.apodise`
+        kwargs -- dictionary of window parameters
+        """
+        if window not in Fid._apodisation_windows:
+            raise ValueError('window must be one of {}.'.format(Fid._apodisation_windows))
+        fcn = getattr(Fid, '_{}_window'.format(window))
+        bound = inspect.signature(fcn).bind(None, None, **kwargs)
+        bound.apply_defaults()
+        return tuple(sorted(list(bound.arguments.items())[2:]))
+
+    @staticmethod
+    def _apodisation_window(window, size, sw_hz, dtype, **kwargs):
+        """
+        Return an apodisation window (see :meth:`~nmrpy.data_objects.Fid.apodise`),
+        computed at the precision of data of the given dtype. Windows are cached in
+        :attr:`~nmrpy.data_objects.Fid._vector_cache`, keyed by (window, size,
+        sw_hz, dtype, parameters), so that FIDs of an array and repeated calls
+        share them, and are read-only.
+
+        Keyword arguments:
+        window -- window name
+        size -- number of points
+        sw_hz -- spectral width in Hz
+        dtype -- dtype of the data to which the window is applied
+        kwargs -- window parameters
+        """
+        params = Fid._window_params(window, kwargs)
+        dtype = numpy.dtype(dtype)
+        dtype = numpy.finfo(dtype).dtype if dtype.kind in 'fc' else numpy.dtype(numpy.double)
+        size = int(size)
+        sw_hz = float(sw_hz)
+
+        def build():
+            t = numpy.arange(size, dtype=numpy.double)
+            x = t/max(size-1, 1)
+            t /= sw_hz
+            fcn = getattr(Fid, '_{}_window'.format(window))
+            return numpy.array(fcn(t, x, **dict(params)), dtype=dtype)
+
+        return Fid._vector_cache.get(('window', window, size, sw_hz, dtype, params), build)
+
+    @staticmethod
+    def _emhz_window(size, lb, sw_hz, dtype):
+        """
+        Return the exponential line-broadening window (see
+        :meth:`~nmrpy.data_objects.Fid._apodisation_window`).
+        """
+        return Fid._apodisation_window('exponential', size, sw_hz, dtype, lb=float(lb))
+
+    @staticmethod
+    def _phase_angles(size, p0, p1):
+        """
+        Return the linear phase-correction angles p0+p1*x/size at double precision.
+        Only the parameter-independent x/size vector is cached (in
+        :attr:`~nmrpy.data_objects.Fid._vector_cache`), as p0 and p1 change with
+        every step of a phasing fit or of the Phaser widget.
+
+        Keyword arguments:
+        size -- number of points
+        p0 -- zero order phase in radians
+        p1 -- first order phase in radians
+        """
+        size = int(size)
+        x = Fid._vector_cache.get(('phase', size), lambda: numpy.arange(size, dtype=numpy.double)/size)
+        angles = x*p1
+        angles += p0
+        return angles
+
+    @staticmethod
+    def _phase_ramp(size, p0, p1, dtype):
+        """
+        Return the linear phase-correction vector exp(i*(p0+p1*x/size)), with the
+        angles computed at double precision and the result stored as dtype, so
+        that the correction is applied in a single multiplication.
+
+        Keyword arguments:
+        size -- number of points
+        p0 -- zero order phase in radians
+        p1 -- first order phase in radians
+        dtype -- complex dtype of the data to which the vector is applied
+        """
+        angles = Fid._phase_angles(size, p0, p1)
+        ramp = numpy.empty(len(angles), dtype=dtype)
+        numpy.cos(angles, out=ramp.real)
+        numpy.sin(angles, out=ramp.imag)
+        return ramp
+
+    def _multiply_data(self, factor):
+        """
+        Multiply :attr:`~nmrpy.data_objects.Fid.data` by factor, in place where
+        the data are writeable and the product keeps their dtype.
+
+        Keyword arguments:
+        factor -- scalar or array broadcastable against the data
+        """
+        data = self.data
+        if data.flags.writeable and numpy.result_type(data, factor) == data.dtype:
+            numpy.multiply(data, factor, out=data)
+            self._mark_dirty('data')
+        else:
+            self.data = factor*data
 
     def real(self):
         """
@@ -461,7 +865,7 @@ class Fid(Base):
         Fourier Transform the data array :attr:`~nmrpy.data_objects.Fid.data`.
 
         Calculates the Discrete Fourier Transform using the Fast Fourier
-        Transform algorithm as implemented in NumPy (*Cooley, James W., and John W.
+        Transform algorithm as implemented in scipy.fft (*Cooley, James W., and John W.
         Tukey, 1965, 'An algorithm for the machine calculation of complex Fourier
         series,' Math. Comput. 19: 297-301.*)
 
@@ -483,7 +887,7 @@ class Fid(Base):
             raise ValueError('Wrong number of parameters. list_params must contain [<data>, <file_format>]')
         data, file_format = list_params
         if Fid._is_valid_dataset(data) and file_format in Fid._file_formats:
-            data = numpy.array(numpy.fft.fft(data), dtype=data.dtype)
+            data = numpy.array(scipy.fft.fft(data), dtype=data.dtype)
             s = len(data)
             if file_format == 'varian' or file_format == None:
                     ft_data = numpy.append(data[int(s / 2.0):], data[: int(s / 2.0)])
@@ -491,6 +895,46 @@ class Fid(Base):
                     ft_data = numpy.append(data[int(s / 2.0):: -1], data[s: int(s / 2.0): -1])
             return ft_data
 
+    @classmethod
+    def _ft_array(cls, data, file_format, workers=1, out=None, chunk_size=2**24):
+        """
+        Fourier-transform a 2D array of FIDs along its second axis. Rows are
+        ordered exactly as by :meth:`~nmrpy.data_objects.Fid._ft`. The FFT is
+        computed a chunk of rows at a time and each chunk is half-swapped
+        straight into out, so only one chunk of FFT output is held at once.
+
+        :arg data: 2D array of FIDs of equal length
+
+        :arg file_format: 'varian', 'bruker' or None
+
+        :keyword workers: number of threads used by scipy.fft (-1 for all CPUs)
+
+        :keyword out: array of the shape of data into which the result is written, which may be data itself; by default a new array of the dtype of data
+
+        :keyword chunk_size: maximum size in bytes of the FFT output computed at once
+        """
+        data = numpy.asarray(data)
+        if data.ndim != 2:
+            raise ValueError('data must be 2D.')
+        if file_format not in Fid._file_formats:
+            raise ValueError('file_format must be "varian", "bruker", or None.')
+        if out is None:
+            out = numpy.empty(data.shape, dtype=data.dtype)
+        elif out.shape != data.shape:
+            raise ValueError('out must have the shape of data.')
+        rows, size = data.shape
+        half = int(size/2.0)
+        step = max(1, chunk_size//max(1, 16*size))
+        for start in range(0, rows, step):
+            ft_data = scipy.fft.fft(data[start:start+step], axis=1, workers=workers)
+            chunk = out[start:start+step]
+            if file_format == 'bruker':
+                chunk[:, :half+1] = ft_data[:, half::-1]
+                chunk[:, half+1:] = ft_data[:, :half:-1]
+            else:
+                chunk[:, :size-half] = ft_data[:, half:]
+                chunk[:, size-half:] = ft_data[:, :half]
+        return out
 
     @staticmethod
     def _conv_to_ppm(data, index, sw_left, sw):
@@ -561,7 +1005,9 @@ class Fid(Base):
                     ('p0', 1.0, True),
                     ('p1', 0.0, True),
                     )
-            mz = lmfit.minimize(Fid._phased_data_sum, p, args=([data]), method=method)
+            # the phase angles are always fitted at double precision
+            fit_data = numpy.asarray(data, dtype=numpy.result_type(data.dtype, numpy.cdouble))
+            mz = lmfit.minimize(Fid._phased_data_sum, p, args=([fit_data]), method=method)
             phased_data = Fid._ps(data, p0=mz.params['p0'].value, p1=mz.params['p1'].value)
             if abs(phased_data.min()) > abs(phased_data.max()):
                     phased_data *= -1
@@ -572,7 +1018,13 @@ class Fid(Base):
         
     @classmethod
     def _phased_data_sum(cls, pars, data):
-            err = Fid._ps(data, p0=pars['p0'].value, p1=pars['p1'].value).real
+            # Re(exp(i*angles)*data) = cos(angles)*Re(data) - sin(angles)*Im(data),
+            # without forming the complex phase ramp or phased data
+            p0 = pars['p0'].value*numpy.pi/180.0
+            p1 = pars['p1'].value*numpy.pi/180.0
+            angles = Fid._phase_angles(len(data), p0, p1)
+            err = numpy.cos(angles)*data.real
+            err -= numpy.sin(angles)*data.imag
             return numpy.array([abs(err).sum()]*2)
 
     @classmethod
@@ -592,9 +1044,7 @@ class Fid(Base):
             # convert to radians
             p0 = p0*numpy.pi/180.0
             p1 = p1*numpy.pi/180.0
-            size = len(data)
-            ph = numpy.exp(1.0j*(p0+(p1*numpy.arange(size)/size)))
-            return ph*data
+            return Fid._phase_ramp(len(data), p0, p1, data.dtype)*data
 
     def ps(self, p0=0.0, p1=0.0):
         """
@@ -612,9 +1062,7 @@ class Fid(Base):
         # convert to radians
         p0 = p0*numpy.pi/180.0
         p1 = p1*numpy.pi/180.0
-        size = len(self.data)
-        ph = numpy.exp(1.0j*(p0+(p1*numpy.arange(size)/size)))
-        self.data = ph*self.data
+        self._multiply_data(Fid._phase_ramp(len(self.data), p0, p1, self.data.dtype))
 
     def phaser(self):
         """
@@ -628,19 +1076,35 @@ class Fid(Base):
             raise AttributeError('data must be 1 dimensional.')
         self._phaser_widget = Phaser(self)
 
-    def baseline_correct(self, deg=2):
+    def baseline_correct(self, deg=2, method='polynomial', lam=1e6, p=0.001, n_iter=10):
         """
 
         Perform baseline correction by fitting specified baseline points
         (stored in :attr:`~nmrpy.data_objects.Fid._bl_ppm`) with polynomial of specified
         degree (stored in :attr:`~nmrpy.data_objects.Fid._bl_ppm`) and subtract this
         polynomial from :attr:`~nmrpy.data_objects.Fid.data`.
-        
+
+        Alternatively, with method='als', estimate the baseline by asymmetric
+        least squares smoothing (Eilers and Boelens, 2005), which follows broad,
+        wavy baselines and requires no baseline points to be selected. The
+        baseline z minimises sum(w*(y-z)**2) + lam*sum(diff(z, 2)**2), with
+        weights w of p where the data lie above the baseline and 1-p elsewhere,
+        iterated n_iter times. Each iteration solves a banded system in O(n) time.
+        The fitted baseline is stored in :attr:`~nmrpy.data_objects.Fid._bl_poly`.
 
         :keyword deg: degree of fitted polynomial
+
+        :keyword method: 'polynomial' or 'als'
+
+        :keyword lam: 'als': smoothness of the baseline; larger values give stiffer baselines (1e6)
+
+        :keyword p: 'als': asymmetry, the weight of points above the baseline (0.001)
+
+        :keyword n_iter: 'als': maximum number of reweighting iterations (10)
         """
 
-        if self._bl_indices is None:
+        Fid._check_baseline_method(method, lam, p, n_iter)
+        if method == 'polynomial' and self._bl_indices is None:
             raise AttributeError('No points selected for baseline correction. Run fid.baseliner()')
         if not len(self.data):
             raise AttributeError('data does not exist.')
@@ -650,17 +1114,107 @@ class Fid(Base):
             raise AttributeError('data must be 1 dimensional.')
         
         data = self.data
-        x = numpy.arange(len(data))
-        m = numpy.ones_like(x)
-        m[self._bl_indices] = 0
-        self._bl_poly = []
-        ym = numpy.ma.masked_array(data, m)
-        xm = numpy.ma.masked_array(x, m)
-        p = numpy.ma.polyfit(xm, ym, deg)
-        yp = scipy.polyval(p, x)
+        if method == 'als':
+            yp = Fid._als_baselines(data[numpy.newaxis], lam, p, n_iter)[0]
+        else:
+            yp = Fid._polynomial_baselines(data[numpy.newaxis], self._bl_indices, deg)[0]
         self._bl_poly = yp
-        data_bl = data-yp
-        self.data = numpy.array(data_bl)
+        self.data = data-yp
+
+    @staticmethod
+    def _check_baseline_method(method, lam, p, n_iter):
+        """
+        Validate the baseline correction method and its parameters (see
+        :meth:`~nmrpy.data_objects.Fid.baseline_correct`).
+        """
+        if method not in ['polynomial', 'als']:
+            raise ValueError('method must be "polynomial" or "als".')
+        if method == 'als':
+            if not isinstance(lam, numbers.Real) or lam <= 0:
+                raise ValueError('lam must be a positive number.')
+            if not isinstance(p, numbers.Real) or not 0 < p < 1:
+                raise ValueError('p must be between 0 and 1.')
+            if not isinstance(n_iter, numbers.Integral) or n_iter < 1:
+                raise ValueError('n_iter must be a positive integer.')
+
+    @staticmethod
+    def _als_penalty(size):
+        """
+        Return the second-difference penalty matrix D.T*D of the asymmetric least
+        squares baseline in the upper banded form used by scipy.linalg.solveh_banded.
+
+        Keyword arguments:
+        size -- number of points
+        """
+        penalty = numpy.zeros((3, size))
+        penalty[0, 2:] = 1.0
+        penalty[1, 2:] -= 2.0
+        penalty[1, 1:-1] -= 2.0
+        penalty[2, :-2] += 1.0
+        penalty[2, 1:-1] += 4.0
+        penalty[2, 2:] += 1.0
+        return penalty
+
+    @staticmethod
+    def _als_baselines(data, lam, p, n_iter):
+        """
+        Return the asymmetric least squares baselines of each row of the 2D array
+        data (see :meth:`~nmrpy.data_objects.Fid.baseline_correct`). The penalty
+        matrix is built once and shared by all rows; the reweighting is applied to
+        all rows at once, and each row's banded system is solved with
+        scipy.linalg.solveh_banded. The systems are solved at double precision and
+        the baselines returned at the precision of data.
+
+        Keyword arguments:
+        data -- 2D array of real spectra
+        lam -- smoothness
+        p -- asymmetry
+        n_iter -- maximum number of reweighting iterations
+        """
+        rows, size = data.shape
+        if size < 3:
+            raise ValueError('data must contain at least 3 points.')
+        penalty = lam*Fid._als_penalty(size)
+        y = numpy.asarray(data, dtype=numpy.double)
+        weights = numpy.ones((rows, size))
+        baselines = numpy.empty((rows, size))
+        active = numpy.arange(rows)
+        band = numpy.empty_like(penalty)
+        for i in range(n_iter):
+            for row in active:
+                band[:] = penalty
+                band[2] += weights[row]
+                baselines[row] = scipy.linalg.solveh_banded(band, weights[row]*y[row], check_finite=False)
+            new_weights = numpy.where(y[active] > baselines[active], p, 1.0-p)
+            # rows whose weights no longer change have converged
+            changed = (new_weights != weights[active]).any(axis=1)
+            weights[active] = new_weights
+            active = active[changed]
+            if len(active) == 0:
+                break
+        return baselines.astype(numpy.result_type(data.dtype, numpy.single), copy=False)
+
+    @staticmethod
+    def _polynomial_baselines(data, indices, deg):
+        """
+        Fit polynomials of degree deg to the points at indices of each row of the
+        2D array data, and return the fitted baselines as an array of the shape of
+        data. The Vandermonde matrix of the baseline points is factorised once and
+        all rows are solved for together, so the cost of fitting many spectra that
+        share their baseline points is dominated by two matrix products.
+
+        Keyword arguments:
+        data -- 2D array of real spectra
+        indices -- indices of the baseline points, common to all rows
+        deg -- degree of the polynomials
+        """
+        size = data.shape[1]
+        indices = numpy.unique(indices)
+        # fit in x scaled to [-1, 1] to keep the Vandermonde matrix well-conditioned
+        x = numpy.linspace(-1.0, 1.0, size)
+        vander = numpy.vander(x, deg+1)
+        coefficients = numpy.linalg.lstsq(vander[indices], data[:, indices].T, rcond=None)[0]
+        return numpy.dot(coefficients.T, vander.T)
 
     def peakpick(self, thresh=0.1):
         """ 
@@ -720,6 +1274,73 @@ Ctrl+Alt+Right - assign
                                 title=plot_title,
                                 label=plot_label,
                                 )
+
+    def auto_baseliner(self, width=0.02, thresh=3.0):
+        """
+        Automatically select signal-free points of :attr:`~nmrpy.data_objects.Fid.data`
+        for baseline-correction, as an alternative to the
+        :meth:`~nmrpy.data_objects.Fid.baseliner` GUI widget. Selected points are
+        stored in :attr:`~nmrpy.data_objects.Fid._bl_ppm` (see
+        :meth:`~nmrpy.data_objects.Fid._signal_free_points` for the method).
+
+        :keyword width: half-width in ppm of the window over which the derivative is averaged; signal regions are extended by twice this width on either side
+
+        :keyword thresh: number of standard deviations of the baseline derivative above which points are considered signal
+        """
+        if not self._flags['ft']:
+            raise ValueError('Only Fourier-transformed data can be baseline-corrected.')
+        data = numpy.real(self.data)
+        half_width = self._width_to_points(width, len(data))
+        mask = Fid._signal_free_points(data[numpy.newaxis], half_width, thresh)[0]
+        self._bl_ppm = self._ppm[mask]
+
+    def _width_to_points(self, width, size):
+        """
+        Convert a width in ppm to a number of points (at least 1).
+
+        Keyword arguments:
+        width -- width in ppm
+        size -- number of points of the spectrum
+        """
+        if not isinstance(width, numbers.Real) or width <= 0:
+            raise ValueError('width must be a positive number.')
+        return max(1, int(round(width*size/self._params['sw'])))
+
+    @staticmethod
+    def _signal_free_points(data, half_width, thresh, n_iter=10):
+        """
+        Return a boolean mask of the signal-free points of each row of the 2D
+        array data. The absolute first derivative of each spectrum is averaged
+        over a window of 2*half_width+1 points, which suppresses noise while
+        being insensitive to broad baseline distortions. Points whose averaged
+        derivative exceeds the mean by more than thresh standard deviations,
+        both estimated from the remaining (baseline) points, are iteratively
+        classified as signal. Signal regions are then extended by 2*half_width
+        points on either side to include the wings of peaks. All rows are
+        processed together.
+
+        Keyword arguments:
+        data -- 2D array of real spectra
+        half_width -- half-width in points of the averaging window
+        thresh -- threshold in standard deviations
+        n_iter -- maximum number of iterations
+        """
+        if not isinstance(thresh, numbers.Real) or thresh <= 0:
+            raise ValueError('thresh must be a positive number.')
+        derivative = numpy.abs(numpy.gradient(numpy.asarray(data, dtype=numpy.double), axis=1))
+        derivative = scipy.ndimage.uniform_filter1d(derivative, 2*half_width+1, axis=1, mode='nearest')
+        signal = numpy.zeros(derivative.shape, dtype=bool)
+        for i in range(n_iter):
+            baseline = numpy.where(signal, 0.0, derivative)
+            count = numpy.maximum((~signal).sum(axis=1, keepdims=True), 1)
+            mean = baseline.sum(axis=1, keepdims=True)/count
+            std = numpy.sqrt((numpy.where(signal, 0.0, (derivative-mean)**2)).sum(axis=1, keepdims=True)/count)
+            new_signal = derivative > mean+thresh*std
+            if numpy.array_equal(new_signal, signal):
+                break
+            signal = new_signal
+        signal = scipy.ndimage.maximum_filter1d(signal, 4*half_width+1, axis=1, mode='nearest')
+        return ~signal
   
     @classmethod
     def _f_gauss(cls, offset, amplitude, gauss_sigma, x):
@@ -777,13 +1398,115 @@ Ctrl+Alt+Right - assign
         if frac_gauss < 0.0:
             frac_gauss = 0.0
         
-        gauss_peak = cls._f_gauss(offset, amplitude, gauss_sigma, x)
-        lorentz_peak = cls._f_lorentz(offset, amplitude, lorentz_hwhm, x)
-        peak = frac_gauss*gauss_peak + (1-frac_gauss)*lorentz_peak
-        
-        return peak
-   
+        return cls._f_pks_array([parameters], x)[0]
+
+    @staticmethod
+    def _f_pks_support(parameterset_list, x, cutoff):
+        """
+        Return arrays of the start and stop indices of the region of x lying
+        within cutoff linewidths (the larger of gauss_sigma and lorentz_hwhm)
+        of each peak offset. x must be sorted in ascending order.
+        """
+        p = numpy.asarray(parameterset_list, dtype='f8').reshape(-1, 5)
+        half_width = cutoff*numpy.maximum(abs(p[:, 1]), abs(p[:, 2]))
+        starts = numpy.searchsorted(x, p[:, 0]-half_width, side='left')
+        stops = numpy.searchsorted(x, p[:, 0]+half_width, side='right')
+        return starts, stops
+
+    @classmethod
+    def _f_pks_array(cls, parameterset_list, x, out=None, cutoff=None):
+        """
+        Unvalidated kernel evaluating a set of peaks over x in a single
+        broadcasted operation. See _f_pk().
 
+        Keyword arguments:
+        parameterset_list -- an (n, 5) array-like of parameter lists: [spectral offset (x), 
+                                        gauss: 2*sigma**2, 
+                                        lorentz: scale (HWHM), 
+                                        amplitude: amplitude of peak, 
+                                        frac_gauss: fraction of function to be Gaussian (0 -> 1)]
+        x -- 1D array of equal length to FID
+        out -- optional preallocated float array of shape (n, len(x)) for the result
+        cutoff -- if not None, each peak is only evaluated within this many
+                  linewidths of its offset and is zero elsewhere (x must be sorted)
+
+        returns an (n, len(x)) array of peak evaluations
+        """
+        p = numpy.asarray(parameterset_list, dtype='f8').reshape(-1, 5)
+        if out is None:
+            out = numpy.empty((len(p), len(x)))
+        if cutoff is not None:
+            out[:] = 0.0
+            for i, (start, stop) in enumerate(zip(*cls._f_pks_support(p, x, cutoff))):
+                cls._f_pks_array(p[i], x[start:stop], out=out[i:i+1, start:stop])
+            return out
+        offset, gauss_sigma, lorentz_hwhm, amplitude, frac_gauss = p.T[:, :, numpy.newaxis]
+        frac_gauss = frac_gauss.clip(0.0, 1.0)
+        lorentz_hwhm_sq = lorentz_hwhm**2.0
+        # out holds the squared distances from the offsets, then the peaks
+        numpy.subtract(x, offset, out=out)
+        numpy.square(out, out=out)
+        lorentz = numpy.add(out, lorentz_hwhm_sq)
+        numpy.divide(lorentz_hwhm_sq, lorentz, out=lorentz)
+        lorentz *= 1.0-frac_gauss
+        out *= -1.0/(2.0*gauss_sigma**2.0)
+        numpy.exp(out, out=out)
+        out *= frac_gauss
+        out += lorentz
+        out *= amplitude
+        return out
+
+    @classmethod
+    def _f_pks_sum(cls, parameterset_list, x, cutoff=None):
+        """
+        Unvalidated sum of the peaks evaluated by _f_pks_array(). With a cutoff,
+        only the points within cutoff linewidths of each peak are computed, so
+        the cost scales with the number of peaks times their linewidths rather
+        than the length of x.
+        """
+        if cutoff is None:
+            return cls._f_pks_array(parameterset_list, x).sum(0)
+        p = numpy.asarray(parameterset_list, dtype='f8').reshape(-1, 5)
+        peaks = numpy.zeros(len(x))
+        for i, (start, stop) in enumerate(zip(*cls._f_pks_support(p, x, cutoff))):
+            peaks[start:stop] += cls._f_pks_array(p[i], x[start:stop])[0]
+        return peaks
+
+    @classmethod
+    def _f_pks_jacobian(cls, parameterset_list, x, cutoff=None):
+        """
+        Unvalidated analytic partial derivatives of the peaks evaluated by
+        _f_pks_array() with respect to their parameters.
+
+        Keyword arguments:
+        parameterset_list -- an (n, 5) array-like of parameter lists (see _f_pks_array())
+        x -- 1D array of equal length to FID
+        cutoff -- see _f_pks_array()
+
+        returns an (n, 5, len(x)) array of derivatives with respect to offset,
+        gauss_sigma, lorentz_hwhm, amplitude and frac_gauss
+        """
+        p = numpy.asarray(parameterset_list, dtype='f8').reshape(-1, 5)
+        if cutoff is not None:
+            jac = numpy.zeros((len(p), 5, len(x)))
+            for i, (start, stop) in enumerate(zip(*cls._f_pks_support(p, x, cutoff))):
+                jac[i, :, start:stop] = cls._f_pks_jacobian(p[i], x[start:stop])[0]
+            return jac
+        offset, gauss_sigma, lorentz_hwhm, amplitude, frac_gauss = p.T[:, :, numpy.newaxis]
+        frac_gauss = frac_gauss.clip(0.0, 1.0)
+        d = x-offset
+        d_sq = d**2.0
+        gauss = numpy.exp(-d_sq/(2.0*gauss_sigma**2.0))
+        lorentz_denom = 1.0/(lorentz_hwhm**2.0+d_sq)
+        lorentz = lorentz_hwhm**2.0*lorentz_denom
+        jac = numpy.empty((len(p), 5, len(x)))
+        jac[:, 0] = amplitude*d*(frac_gauss*gauss/gauss_sigma**2.0 + \
+                (1.0-frac_gauss)*2.0*lorentz*lorentz_denom)
+        jac[:, 1] = amplitude*frac_gauss*gauss*d_sq/gauss_sigma**3.0
+        jac[:, 2] = amplitude*(1.0-frac_gauss)*2.0*lorentz_hwhm*d_sq*lorentz_denom**2.0
+        jac[:, 3] = frac_gauss*gauss + (1.0-frac_gauss)*lorentz
+        jac[:, 4] = amplitude*(gauss-lorentz)
+        return jac
 
     @classmethod
     def _f_makep(cls, data, peaks, frac_gauss=None):
@@ -853,7 +1576,7 @@ Ctrl+Alt+Right - assign
         return max_data_convolution - max_auto_convolution
 
     @classmethod 
-    def _f_pks_list(cls, parameterset_list, x):
+    def _f_pks_list(cls, parameterset_list, x, cutoff=None):
         """
         Return a list of peak evaluations for deconvolution. See _f_pk().
         
@@ -864,19 +1587,20 @@ Ctrl+Alt+Right - assign
                                         amplitude: amplitude of peak, 
                                         frac_gauss: fraction of function to be Gaussian (0 -> 1)]
         x -- array of equal length to FID
+        cutoff -- evaluate each peak only within this many linewidths of its offset (see _f_pks_array())
         """
         if not cls._is_iter_of_iters(parameterset_list):
             raise TypeError('Parameter set must be an iterable of iterables') 
         for p in parameterset_list:
             if not cls._is_iter(p):
                 raise TypeError('Parameter set must be an iterable') 
-            if not all(isinstance(i, numbers.Number) for i in p):
+            if not cls._all_numbers(p):
                 raise TypeError('Keyword parameters must be numbers.') 
         if not cls._is_iter(x):
             raise TypeError('x must be an iterable') 
         if not isinstance(x, numpy.ndarray):
             x = numpy.array(x) 
-        return numpy.array([Fid._f_pk(x, *peak) for peak in parameterset_list])
+        return cls._f_pks_array(parameterset_list, x, cutoff=cutoff)
         
 
     @classmethod 
@@ -898,27 +1622,16 @@ Ctrl+Alt+Right - assign
         for p in parameterset_list:
             if not cls._is_iter(p):
                 raise TypeError('Parameter set must be an iterable') 
-            if not all(isinstance(i, numbers.Number) for i in p):
+            if not cls._all_numbers(p):
                 raise TypeError('Keyword parameters must be numbers.') 
         if not cls._is_iter(x):
             raise TypeError('x must be an iterable') 
         if not isinstance(x, numpy.ndarray):
             x = numpy.array(x) 
-       
-        peaks = x*0.0
-        for p in parameterset_list:
-            peak = cls._f_pk(x, 
-                    offset=p[0], 
-                    gauss_sigma=p[1], 
-                    lorentz_hwhm=p[2], 
-                    amplitude=p[3], 
-                    frac_gauss=p[4],
-                    )
-            peaks += peak
-        return peaks
+        return cls._f_pks_sum(parameterset_list, x)
 
     @classmethod
-    def _f_res(cls, p, data):
+    def _f_res(cls, p, data, cutoff=None):
         """
         Objective function for deconvolution. Returns residuals of the devonvolution fit.
         
@@ -933,6 +1646,7 @@ Ctrl+Alt+Right - assign
                             frac_gauss_n -- fraction of function to be Gaussian (0 -> 1)
             where n is the peak number (zero-indexed)
         data -- spectrum array
+        cutoff -- evaluate each peak only within this many linewidths of its offset (see _f_pks_array())
         
         """
         if not isinstance(p, lmfit.parameter.Parameters):
@@ -944,16 +1658,32 @@ Ctrl+Alt+Right - assign
        
         params = Fid._parameters_to_list(p)
         x = numpy.arange(len(data), dtype='f8')
-        res = data-cls._f_pks(params, x)
+        res = cls._f_pks_sum(params, x, cutoff=cutoff)
+        numpy.subtract(data, res, out=res)
         return res
 
     @classmethod
-    def _f_fitp(cls, data, peaks, frac_gauss=None, method='leastsq'):
+    def _f_res_jac(cls, p, data, cutoff=None):
+        """
+        Analytic Jacobian of the deconvolution objective function _f_res() with
+        respect to the varying parameters in p, of shape (len(data), n_varying).
+        See _f_res() for arguments.
+        """
+        params = Fid._parameters_to_list(p)
+        x = numpy.arange(len(data), dtype='f8')
+        jac = -cls._f_pks_jacobian(params, x, cutoff=cutoff).reshape(-1, len(x))
+        vary = [p['%s_%i'%(par, i)].vary for i in range(len(params))
+                for par in ['offset', 'sigma', 'hwhm', 'amplitude', 'frac_gauss']]
+        return jac[vary].transpose()
+
+    @classmethod
+    def _f_fitp(cls, data, peaks, frac_gauss=None, method='leastsq', cutoff=None):
         """Fit a section of spectral data with a combination of Gaussian/Lorentzian peaks for deconvolution.
         
         Keyword arguments:
         peaks -- selected peak positions (see peakpicker())
         frac_gauss -- fraction of fitted function to be Gaussian (1 - Guassian, 0 - Lorentzian)
+        cutoff -- evaluate each peak only within this many linewidths of its offset (see _f_pks_array())
    
         returns:
             fits -- list of fitted peak parameter sets
@@ -1000,8 +1730,14 @@ Ctrl+Alt+Right - assign
                 if 'amplitude' in par_name:
                     params[par_name].max = 2.0*data.max()
                     
+        # analytic Jacobian for the least-squares methods that accept one
+        fit_kws = {}
+        if method == 'leastsq':
+            fit_kws['Dfun'] = cls._f_res_jac
+        elif method == 'least_squares':
+            fit_kws['jac'] = cls._f_res_jac
         try:
-            mz = lmfit.minimize(cls._f_res, params, args=([data]), method=method)
+            mz = lmfit.minimize(cls._f_res, params, args=([data]), kws={'cutoff': cutoff}, method=method, **fit_kws)
             fits = Fid._parameters_to_list(mz.params)
         except:
             fits = None
@@ -1017,15 +1753,23 @@ Ctrl+Alt+Right - assign
         return params
 
 
+    @staticmethod
+    def _check_cutoff(cutoff):
+        if cutoff is not None and (not isinstance(cutoff, numbers.Number) or cutoff <= 0):
+            raise ValueError('cutoff must be a positive number or None.')
+
     @classmethod
     def _deconv_datum(cls, list_parameters):
-        if len(list_parameters) != 5:
-            raise ValueError('list_parameters must consist of five objects.')
+        if len(list_parameters) not in [5, 6]:
+            raise ValueError('list_parameters must consist of five or six objects.')
         if (type(list_parameters[1]) == list and len(list_parameters[1]) == 0) or \
            (type(list_parameters[2]) == list and len(list_parameters[2]) == 0):
             return []
 
-        datum, peaks, ranges, frac_gauss, method = list_parameters
+        datum, peaks, ranges, frac_gauss, method = list_parameters[:5]
+        cutoff = None
+        if len(list_parameters) == 6:
+            cutoff = list_parameters[5]
 
         if not cls._is_iter_of_iters(ranges):
             raise TypeError('ranges must be an iterable of iterables') 
@@ -1042,14 +1786,14 @@ Ctrl+Alt+Right - assign
         for j in zip(peaks, ranges):
             d_slice = datum[j[1][0]:j[1][1]]
             p_slice = j[0]-j[1][0]
-            f = cls._f_fitp(d_slice, p_slice, frac_gauss=frac_gauss, method=method)
+            f = cls._f_fitp(d_slice, p_slice, frac_gauss=frac_gauss, method=method, cutoff=cutoff)
             f = numpy.array(f).transpose()
             f[0] += j[1][0]
             f = f.transpose()
             fit.append(f)
         return fit
 
-    def deconv(self, method='leastsq', frac_gauss=0.0):
+    def deconv(self, method='leastsq', frac_gauss=0.0, cutoff=None):
         """
 
         Deconvolute :attr:`~nmrpy.data_obects.Fid.data` object by fitting a
@@ -1071,6 +1815,8 @@ Ctrl+Alt+Right - assign
             Powell (powell)
         
             Newton-CG  (newton)
+
+        :keyword cutoff: if specified, each peak is only evaluated within this many linewidths of its offset during fitting, so that fitting time no longer scales with the width of the ranges. Lorentzian tails are truncated at 1/(1+cutoff**2) of the peak height, so values of 50 or more are recommended.
         
         """
 
@@ -1082,8 +1828,9 @@ Ctrl+Alt+Right - assign
             raise AttributeError('peaks must be picked.')
         if self.ranges is None:
             raise AttributeError('ranges must be specified.')
+        Fid._check_cutoff(cutoff)
         print('deconvoluting {}'.format(self.id))
-        list_parameters = [self.data, self._grouped_index_peaklist, self._index_ranges, frac_gauss, method]
+        list_parameters = [self.data, self._grouped_index_peaklist, self._index_ranges, frac_gauss, method, cutoff]
         self._deconvoluted_peaks = numpy.array([j for i in Fid._deconv_datum(list_parameters) for j in i])
         print('deconvolution completed')
 
@@ -1120,6 +1867,8 @@ Ctrl+Alt+Right - assign
         :keyword peak_colour: colour of the deconvoluted peaks
 
         :keyword residual_colour: colour of the residual signal after subtracting deconvoluted peaks
+
+        :keyword cutoff: only evaluate each deconvoluted peak within this many linewidths of its offset
         """
         if not len(self._deconvoluted_peaks):
             raise AttributeError('deconvolution not yet performed')
@@ -1143,8 +1892,34 @@ class FidArray(Base):
     where 'XX' is an increasing integer .
 
     '''
+    _data_block = None
+    _data_capacity = None
+    _pool = None
+    _pool_cpus = None
+    _pool_chunksize = None
+    _project_path = None
+    _stage_cache = None
+
     def __str__(self):
-        return 'FidArray of {} FID(s)'.format(len(self.data))
+        return 'FidArray of {} FID(s)'.format(len(self.get_fids()))
+
+    def __getstate__(self):
+        # the data block (and the spare capacity it may be a view of) is rebuilt
+        # from the Fid rows on first access, so it is not pickled a second time
+        # alongside them; worker pools cannot be pickled;
+        # the project path only refers to where this instance was last saved, and
+        # the stage cache is enabled per session
+        state = self.__dict__.copy()
+        for attr in ['_data_block', '_data_capacity', '_pool', '_pool_cpus', '_pool_finalizer', '_project_path',
+                     '_stage_cache']:
+            state.pop(attr, None)
+        return state
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close_pool()
 
     def get_fid(self, id):
         """
@@ -1161,11 +1936,23 @@ class FidArray(Base):
 
     def get_fids(self):
         """
-        Return a list of all :class:`~nmrpy.data_objects.Fid` objects owned by this :class:`~nmrpy.data_objects.FidArray`.
+        Return a list of all :class:`~nmrpy.data_objects.Fid` objects owned by this :class:`~nmrpy.data_objects.FidArray`,
+        in natural order of their ids (e.g. 'fid9' before 'fid10').
         """
-        fids = [self.__dict__[id] for id in sorted(self.__dict__) if isinstance(self.__dict__[id], Fid)]
+        fids = [self.__dict__[id] for id in sorted(self.__dict__, key=self._natural_key) \
+                if isinstance(self.__dict__[id], Fid)]
         return fids
 
+    @staticmethod
+    def _natural_key(id):
+        """
+        Sort key ordering the integers within id numerically.
+
+        Keyword arguments:
+        id -- the string to sort
+        """
+        return [int(part) if part.isdigit() else part for part in re.split(r'(\d+)', id)]
+
     def _get_plots(self):
         """
         Return a list of all :class:`~nmrpy.plotting.Plot` objects owned by this :class:`~nmrpy.data_objects.FidArray`.
@@ -1185,9 +1972,108 @@ class FidArray(Base):
     def data(self):
         """
         An array of all :attr:`~nmrpy.data_objects.Fid.data` objects belonging to the :class:`~nmrpy.data_objects.Fid` objects owned by this :class:`~nmrpy.data_objects.FidArray`.
+
+        If all FIDs share a length and dtype, this is a single contiguous
+        (n_fids x n_points) array of which each :attr:`~nmrpy.data_objects.Fid.data`
+        is a row view: reading it does not copy, and modifying it in place
+        modifies the FIDs.
         """
-        data = numpy.array([fid.data for fid in self.get_fids()])
-        return data
+        fids = self.get_fids()
+        if not self._data_block_is_current(fids):
+            self._consolidate_data(fids)
+        if self._data_block is not None:
+            return self._data_block
+        return numpy.array([fid.data for fid in fids])
+
+    def _data_block_is_current(self, fids):
+        """
+        Check that every :class:`~nmrpy.data_objects.Fid` in fids is still a row
+        view of the data block, i.e. that no data have been reassigned since the
+        block was built.
+        """
+        block = self._data_block
+        if block is None or len(block) != len(fids):
+            return False
+        for row, fid in zip(block, fids):
+            data = fid.data
+            if data.shape != row.shape or data.dtype != row.dtype or \
+               data.ctypes.data != row.ctypes.data:
+                return False
+        return True
+
+    def _consolidate_data(self, fids=None):
+        """
+        Copy all :attr:`~nmrpy.data_objects.Fid.data` into a single contiguous data
+        block and rebind each :class:`~nmrpy.data_objects.Fid` to its row. FIDs of
+        differing length or dtype cannot share a block and are left untouched.
+        """
+        if fids is None:
+            fids = self.get_fids()
+        if len(fids) == 0 or len(set((fid.data.shape, fid.data.dtype) for fid in fids)) != 1:
+            self._data_block = None
+            return
+        self._set_data_block(numpy.array([fid.data for fid in fids]), fids, dirty=False)
+
+    def _set_data_block(self, data, fids=None, dirty=True):
+        """
+        Replace the data block with the 2D array data and rebind each
+        :class:`~nmrpy.data_objects.Fid` to its corresponding row. dirty is False
+        when the rows hold the FIDs' existing data.
+        """
+        if fids is None:
+            fids = self.get_fids()
+        data = numpy.ascontiguousarray(data)
+        if len(data) != len(fids):
+            raise ValueError('data must contain one row per FID.')
+        self._data_block = data
+        for fid, row in zip(fids, data):
+            fid._bind_data(row, dirty=dirty)
+
+    @property
+    def precision(self):
+        """
+        Floating-point precision of the :class:`~nmrpy.data_objects.Fid` objects
+        owned by this :class:`~nmrpy.data_objects.FidArray`, 'single' or 'double'
+        (see :attr:`~nmrpy.data_objects.Fid.precision`), or None if they differ.
+        Setting it converts the data of all FIDs.
+        """
+        precisions = set(fid.precision for fid in self.get_fids())
+        if len(precisions) == 1:
+            return precisions.pop()
+        return None
+
+    @precision.setter
+    def precision(self, precision):
+        if precision not in self._precisions:
+            raise ValueError('precision must be "single" or "double".')
+        fids = self.get_fids()
+        block = self._data_block
+        if block is not None and all(fid._data_loader is None for fid in fids) and \
+           self._data_block_is_current(fids):
+            # convert the data block in one go rather than FID by FID
+            for fid in fids:
+                fid._precision = precision
+            dtype = self._float_dtype(block.dtype, precision)
+            if dtype is not None and dtype != block.dtype:
+                self._set_data_block(block.astype(dtype), fids)
+        else:
+            for fid in fids:
+                fid.precision = precision
+
+    @property
+    def source_indices(self):
+        """
+        An array of the positions of the :class:`~nmrpy.data_objects.Fid` objects
+        in the experiment they were imported from. These differ from their
+        positions in this :class:`~nmrpy.data_objects.FidArray` if only a subset
+        of FIDs was imported (see the indices argument of
+        :meth:`~nmrpy.data_objects.FidArray.from_path`).
+        """
+        fids = self.get_fids()
+        indices = [fid._source_index for fid in fids]
+        if any(i is None for i in indices):
+            return numpy.arange(len(fids))
+        return numpy.array(indices, dtype=int)
 
     @property
     def t(self):
@@ -1197,11 +2083,12 @@ class FidArray(Base):
         nfids = len(self.get_fids())
         t = None
         if nfids > 0:
+            source_indices = self.source_indices
             try:
                 acqtime = self._params['acqtime'][0]
-                t = (1+numpy.arange(len(self.get_fids())))*acqtime
+                t = (1+source_indices)*acqtime
             except:
-                t = numpy.arange(len(self.get_fids()))
+                t = source_indices
         return t
 
     @property
@@ -1286,10 +2173,35 @@ class FidArray(Base):
             fid = Fid(id=fid_id, data=datum)
             fids.append(fid)
         fid_array.add_fids(fids)
+        fid_array._consolidate_data()
+        return fid_array
+
+    @classmethod
+    def _from_mapped_data(cls, mapped_data, indices=None):
+        """
+        Instantiate a new :class:`~nmrpy.data_objects.FidArray` whose
+        :class:`~nmrpy.data_objects.Fid` objects read their data from mapped_data
+        on first access.
+
+        Keyword arguments:
+        mapped_data -- a _MappedFidData instance
+        indices -- slice or sequence of FID indices to include (default all)
+        """
+        fid_indices = numpy.arange(len(mapped_data))
+        if indices is not None:
+            fid_indices = numpy.atleast_1d(fid_indices[indices])
+        fid_array = cls()
+        # ids are numbered by position in the experiment, as for a full import
+        id_str = 'fid{0:0'+str(len(str(len(mapped_data))))+'d}'
+        for fid_index in fid_indices:
+            fid = Fid(id=id_str.format(fid_index))
+            fid._source_index = int(fid_index)
+            fid._data_loader = mapped_data.loader(fid_index)
+            fid_array.add_fid(fid)
         return fid_array
 
     @classmethod
-    def from_path(cls, fid_path='.', file_format=None):
+    def from_path(cls, fid_path='.', file_format=None, lazy=False, indices=None):
         """
         Instantiate a new :class:`~nmrpy.data_objects.FidArray` object from a .fid directory.
 
@@ -1297,90 +2209,527 @@ class FidArray(Base):
 
         :keyword file_format: 'varian' or 'bruker', usually unnecessary
 
+        :keyword lazy: memory-map the binary file instead of reading it, so that each
+                       :class:`~nmrpy.data_objects.Fid` is only read from disk when its
+                       :attr:`~nmrpy.data_objects.Fid.data` are first accessed. The data
+                       block (:attr:`~nmrpy.data_objects.FidArray.data`) is built once
+                       all FIDs have been read. Useful for large arrayed experiments of
+                       which only a few FIDs are needed.
+
+        :keyword indices: a slice or sequence of FID indices to import from an arrayed
+                          experiment or saved project, e.g. ``slice(None, None, 10)`` for
+                          every 10th FID. Only the selected FIDs are read from disk.
+                          The FIDs keep the ids and acquisition times
+                          (:attr:`~nmrpy.data_objects.FidArray.t`) of their positions
+                          in the experiment, see :attr:`~nmrpy.data_objects.FidArray.source_indices`.
+
         """
         if not file_format:
-            try:
-                with open(fid_path, 'rb') as f:
-                    return pickle.load(f)
-            except:
-                print('Not NMRPy data file.')
-                importer = Importer(fid_path=fid_path)
-                importer.import_fid()
-        elif file_format == 'varian':
-            importer = VarianImporter(fid_path=fid_path)
-            importer.import_fid()
-        elif file_format == 'bruker':
-            importer = BrukerImporter(fid_path=fid_path)
-            importer.import_fid()
-        elif file_format == 'nmrpy':
+            if not isinstance(fid_path, str):
+                raise AttributeError('fid_path must be a string.')
+            file_format = Importer._detect_format(fid_path)
+            if file_format is None:
+                raise IOError('Data could not be imported: {} is not a recognised .fid directory or NMRPy file.'.format(fid_path))
+        if file_format == 'nmrpy':
+            if cls._is_project(fid_path):
+                return cls._from_project(fid_path, indices)
             with open(fid_path, 'rb') as f:
                 return pickle.load(f)
-       
-        if cls._is_iter(importer.data):
+        # subsets are read through a memory map so that unselected FIDs are skipped
+        lazy_import = lazy or indices is not None
+        if file_format == 'varian':
+            importer = VarianImporter(fid_path=fid_path, lazy=lazy_import)
+        elif file_format == 'bruker':
+            importer = BrukerImporter(fid_path=fid_path, lazy=lazy_import)
+        else:
+            raise ValueError('file_format must be "varian", "bruker", "nmrpy", or None.')
+        importer.import_fid()
+
+        if importer._mapped_data is not None:
+            fid_array = cls._from_mapped_data(importer._mapped_data, indices)
+            if not lazy:
+                # reads the selected FIDs into the data block
+                fid_array._consolidate_data()
+        elif cls._is_iter(importer.data):
             fid_array = cls.from_data(importer.data)
+        else:
+            fid_array = None
+        if fid_array is not None:
             fid_array._file_format = importer._file_format
             fid_array.fid_path = fid_path
             fid_array._procpar = importer._procpar
             for fid in fid_array.get_fids():
                 fid._file_format = fid_array._file_format
                 fid.fid_path = fid_array.fid_path
-                fid._procpar = fid_array._procpar
+                fid._share_procpar(fid_array)
             return fid_array 
         else:
             raise IOError('Data could not be imported.')
 
-    def zf_fids(self):
-        """ 
-        Zero-fill all :class:`~nmrpy.data_objects.Fid` objects owned by this :class:`~nmrpy.data_objects.FidArray`
+    @classmethod
+    def from_paths(cls, fid_paths, file_format=None, threads=None, sort=True):
         """
-        for fid in self.get_fids():
-            fid.zf()
-
-    def emhz_fids(self, lb=5.0):
-        """ 
-        Apply line-broadening (apodisation) to all :class:`nmrpy.~data_objects.Fid` objects owned by this :class:`~nmrpy.data_objects.FidArray`
+        Instantiate a new :class:`~nmrpy.data_objects.FidArray` object from many
+        .fid directories, e.g. a series of Bruker experiment numbers. The
+        directories are read concurrently and their FIDs assembled, in order of
+        acquisition, into a single :class:`~nmrpy.data_objects.FidArray`.
 
-        :keyword lb: degree of line-broadening in Hz.
-        """
-        for fid in self.get_fids():
-            fid.emhz(lb=lb)
+        :arg fid_paths: a list of filepaths to .fid directories, or a glob pattern
+                        matching them, e.g. ``'reaction/*'``
 
-    def ft_fids(self, mp=True, cpus=None):
-        """ 
-        Fourier-transform all FIDs.
+        :keyword file_format: 'varian' or 'bruker', usually unnecessary
 
-        :keyword mp: parallelise over multiple processors, significantly reducing computation time
+        :keyword threads: number of directories to read concurrently (defaults to the
+                          number of available CPUs)
+
+        :keyword sort: order the FIDs by the acquisition time recorded in each
+                       directory (True); otherwise the order of fid_paths is kept
+
+        """
+        if isinstance(fid_paths, str):
+            fid_paths = sorted(glob.glob(fid_paths))
+        if not cls._is_iter(fid_paths) or len(fid_paths) == 0:
+            raise ValueError('fid_paths must be a glob pattern or a list of paths.')
+        if file_format not in cls._file_formats:
+            raise ValueError('file_format must be "varian", "bruker", or None.')
+        if threads is None:
+            threads = cls._available_cpus()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=threads) as executor:
+            importers = list(executor.map(
+                lambda fid_path: cls._import_path(fid_path, file_format), fid_paths))
+        for fid_path, importer in zip(fid_paths, importers):
+            if not cls._is_iter(importer.data):
+                raise IOError('Data could not be imported from {}.'.format(fid_path))
+        if sort:
+            timestamps = [cls._acquisition_timestamp(importer._procpar, importer._file_format)
+                          for importer in importers]
+            if None in timestamps:
+                print('Acquisition time not found, FIDs are left in the given order.')
+            else:
+                order = numpy.argsort(timestamps, kind='stable')
+                importers = [importers[i] for i in order]
 
-        :keyword cpus: defines number of CPUs to utilise if 'mp' is set to True
-        """
-        if mp:
-            fids = self.get_fids()
-            list_params = [[fid.data, fid._file_format] for fid in fids]
-            ft_data = self._generic_mp(Fid._ft, list_params, cpus)
-            for fid, datum in zip(fids, ft_data):
-                fid.data = datum
+        fids = []
+        for importer in importers:
+            # parameters are parsed once per experiment
+            source = None
+            for datum in importer.data:
+                fid = Fid(data=datum)
+                fid._file_format = importer._file_format
+                fid.fid_path = importer.fid_path
+                if source is None:
+                    fid._procpar = importer._procpar
+                    source = fid
+                else:
+                    fid._share_procpar(source)
+                fids.append(fid)
+        fid_array = cls()
+        fid_array.add_fids(fids)
+        fid_array._consolidate_data()
+        # the parameters of the first experiment are shared by the FidArray
+        fid_array._file_format = importers[0]._file_format
+        fid_array.fid_path = importers[0].fid_path
+        fid_array._share_procpar(fids[0])
+        return fid_array
+
+    def watch(self, directory, steps=None, file_format=None, interval=1.0, timeout=None):
+        """
+        Watch a directory into which a spectrometer is writing experiments (e.g.
+        successive Bruker experiment numbers) and append the FIDs of each new
+        experiment to this :class:`~nmrpy.data_objects.FidArray` as soon as it has
+        been written. Each new :class:`~nmrpy.data_objects.Fid` is passed through
+        the processing steps and then yielded, so that results can be followed
+        during acquisition, e.g.::
+
+            steps = [('emhz', {'lb': 5.0}), ('ft', {}), ('phase_correct', {}),
+                     ('real', {}), ('baseline_correct', {}), ('deconv', {'frac_gauss': 0.0})]
+            for fid in fid_array.watch('reaction', steps=steps, timeout=600):
+                print(fid_array.t[-1], fid.deconvoluted_integrals)
+
+        New FIDs take their :attr:`~nmrpy.data_objects.Fid.peaks`,
+        :attr:`~nmrpy.data_objects.Fid.ranges` and baseline points from the last FID
+        already in the array, so these only need to be selected once. Experiments
+        whose paths match FIDs already in the array are skipped.
+
+        :arg directory: directory containing the .fid experiment directories
+
+        :keyword steps: a list of (method name, keyword arguments) tuples naming the
+                        :class:`~nmrpy.data_objects.Fid` methods to apply, in order
+
+        :keyword file_format: 'varian' or 'bruker', usually unnecessary
+
+        :keyword interval: seconds between checks of the directory (1.0)
+
+        :keyword timeout: stop once no new experiment has appeared for this many
+                          seconds; by default, watch until interrupted
+        """
+        if not os.path.isdir(directory):
+            raise OSError('{} is not a directory.'.format(directory))
+        if steps is None:
+            steps = []
+        for step in steps:
+            if len(step) != 2 or not isinstance(step[0], str) or not isinstance(step[1], dict):
+                raise ValueError('steps must be a list of (method name, keyword arguments) tuples.')
+            if not callable(getattr(Fid, step[0], None)):
+                raise AttributeError('Fid has no method {}.'.format(step[0]))
+        seen = set(os.path.abspath(fid.fid_path) for fid in self.get_fids())
+        sizes = {}
+        last_change = time.monotonic()
+        while timeout is None or time.monotonic()-last_change < timeout:
+            for fid_path in self._completed_experiments(directory, sizes):
+                if os.path.abspath(fid_path) in seen:
+                    continue
+                seen.add(os.path.abspath(fid_path))
+                last_change = time.monotonic()
+                importer = self._import_path(fid_path, file_format)
+                if not self._is_iter(importer.data):
+                    print('Data could not be imported from {}.'.format(fid_path))
+                    continue
+                source = None
+                for datum in importer.data:
+                    fid = self._append_fid(datum, importer, source)
+                    source = fid
+                    for name, kwargs in steps:
+                        getattr(fid, name)(**kwargs)
+                    self._extend_data_block(fid)
+                    yield fid
+            time.sleep(interval)
+
+    @staticmethod
+    def _completed_experiments(directory, sizes):
+        """
+        Return the experiment directories in directory whose binary file has not
+        grown since the previous call, i.e. that have finished being written, in
+        natural (numerical) order.
+
+        Keyword arguments:
+        directory -- directory containing the experiment directories
+        sizes -- dictionary of binary file sizes, updated in place between calls
+        """
+        completed = []
+        names = sorted(os.listdir(directory), key=lambda name: (len(name), name))
+        for name in names:
+            fid_path = os.path.join(directory, name)
+            for bin_file in ['fid', 'ser']:
+                filename = os.path.join(fid_path, bin_file)
+                if os.path.isfile(filename):
+                    break
+            else:
+                continue
+            size = os.stat(filename).st_size
+            if size > 0 and sizes.get(fid_path) == size:
+                completed.append(fid_path)
+            sizes[fid_path] = size
+        return completed
+
+    def _append_fid(self, data, importer, source=None):
+        """
+        Append a new :class:`~nmrpy.data_objects.Fid` holding data to this
+        :class:`~nmrpy.data_objects.FidArray` and return it. The new FID is numbered
+        after the existing ones, whose ids are left unchanged.
+
+        Keyword arguments:
+        data -- spectral data of the new FID
+        importer -- the :class:`~nmrpy.data_objects.Importer` that read data
+        source -- a FID of the same experiment whose parameters are shared (default None: parse them)
+        """
+        fids = self.get_fids()
+        fid = Fid(data=data)
+        fid._file_format = importer._file_format
+        fid.fid_path = importer.fid_path
+        if source is None:
+            fid._procpar = importer._procpar
+        else:
+            fid._share_procpar(source)
+        if len(fids) > 0:
+            template = fids[-1]
+            fid.peaks = template.peaks
+            fid.ranges = template.ranges
+            # baseline points are only set once the baseliner has been used
+            fid._bl_ppm = getattr(template, '_bl_ppm', None)
+            source_indices = [f._source_index for f in fids]
+            if None not in source_indices:
+                fid._source_index = max(source_indices)+1
+        else:
+            self._file_format = importer._file_format
+            self.fid_path = importer.fid_path
+            self._share_procpar(fid)
+            fid._source_index = 0
+        fid.id = self._next_fid_id(fids)
+        self.add_fid(fid)
+        return fid
+
+    @staticmethod
+    def _next_fid_id(fids):
+        """
+        Return an id of the form 'fidXX' numbered one past the highest numbered id
+        in fids, zero-filled to the same width.
+
+        Keyword arguments:
+        fids -- the :class:`~nmrpy.data_objects.Fid` objects already in the array
+        """
+        numbered = [fid.id[3:] for fid in fids if fid.id[:3] == 'fid' and fid.id[3:].isdigit()]
+        if len(numbered) == 0:
+            return 'fid0'
+        width = max(len(number) for number in numbered)
+        index = max(int(number) for number in numbered)+1
+        return 'fid{0:0{1}d}'.format(index, width)
+
+    def _extend_data_block(self, fid):
+        """
+        Add the data of fid, the last :class:`~nmrpy.data_objects.Fid` in the array,
+        as a new row of the data block. The block is a view of a larger buffer whose
+        capacity is doubled when full, so that appending n FIDs copies O(n) data in
+        total. If the data do not match the block, it is left to be rebuilt on next
+        access.
+
+        Keyword arguments:
+        fid -- the newly appended :class:`~nmrpy.data_objects.Fid`
+        """
+        fids = self.get_fids()
+        previous = fids[:-1]
+        block = self._data_block
+        data = fid.data
+        if len(previous) == 0:
+            block = numpy.empty((0,)+data.shape, dtype=data.dtype)
+        elif block is None or len(block) != len(previous) or \
+             block.shape[1:] != data.shape or block.dtype != data.dtype:
+            return
+        size = len(block)
+        capacity = self._data_capacity
+        if capacity is None or block.base is not capacity or \
+           block.ctypes.data != capacity.ctypes.data or len(capacity) <= size:
+            capacity = numpy.empty((max(2*size, 1),)+data.shape, dtype=data.dtype)
+            capacity[:size] = block
+            for row, old in zip(capacity, previous):
+                old._bind_data(row, dirty=False)
+            self._data_capacity = capacity
+        capacity[size] = data
+        fid._bind_data(capacity[size])
+        self._data_block = capacity[:size+1]
+
+    @staticmethod
+    def _import_path(fid_path, file_format):
+        """
+        Read a single .fid directory, returning the :class:`~nmrpy.data_objects.Importer`.
+
+        Keyword arguments:
+        fid_path -- filepath to .fid directory
+        file_format -- 'varian', 'bruker' or None
+        """
+        if file_format == 'varian':
+            importer = VarianImporter(fid_path=fid_path)
+        elif file_format == 'bruker':
+            importer = BrukerImporter(fid_path=fid_path)
+        else:
+            importer = Importer(fid_path=fid_path)
+        importer.import_fid()
+        return importer
+
+    @staticmethod
+    def _acquisition_timestamp(procpar, file_format):
+        """
+        Return the start of acquisition in seconds since the epoch, or None if it
+        is not recorded.
+
+        Keyword arguments:
+        procpar -- acquisition parameter dictionary, as stored in _procpar
+        file_format -- 'varian' or 'bruker'
+        """
+        try:
+            if file_format == 'bruker':
+                return float(procpar['DATE'])
+            elif file_format == 'varian':
+                time_run = procpar['procpar']['time_run']['values'][0]
+                return datetime.datetime.strptime(time_run, '%Y%m%dT%H%M%S').timestamp()
+        except (KeyError, IndexError, TypeError, ValueError):
+            pass
+        return None
+
+    def zf_fids(self, out=None):
+        """ 
+        Zero-fill all :class:`~nmrpy.data_objects.Fid` objects owned by this :class:`~nmrpy.data_objects.FidArray`
+
+        :keyword out: writeable, C-contiguous (n_fids x 2*n_points) array of the dtype of :attr:`~nmrpy.data_objects.FidArray.data` into which the result is written, and which becomes the new data block; only available when all FIDs share a length and dtype
+        """
+        fids = self.get_fids()
+        data = self.data
+        if data is not self._data_block:
+            self._batch_out(out, None, None)
+            for fid in fids:
+                fid.zf()
+            return
+        rows, size = data.shape
+        out = self._batch_out(out, (rows, 2*size), data.dtype)
+        out[:, :size] = data
+        out[:, size:] = 0
+        self._set_data_block(out, fids)
+
+    def emhz_fids(self, lb=5.0, out=None):
+        """ 
+        Apply line-broadening (apodisation) to all :class:`nmrpy.~data_objects.Fid` objects owned by this :class:`~nmrpy.data_objects.FidArray`
+
+        :keyword lb: degree of line-broadening in Hz.
+
+        :keyword out: writeable, C-contiguous array of the shape and dtype of :attr:`~nmrpy.data_objects.FidArray.data` into which the result is written, and which becomes the new data block; only available when all FIDs share a length and dtype. By default the data are modified in place
+        """
+        fids = self.get_fids()
+        data = self.data
+        if data is not self._data_block:
+            self._batch_out(out, None, None)
+            for fid in fids:
+                fid.emhz(lb=lb)
+            return
+        # FIDs sharing a spectral width share a cached window
+        factors = [Fid._emhz_window(data.shape[1], lb, fid._params['sw_hz'], data.dtype) for fid in fids]
+        self._multiply_fids(fids, data, factors, out)
+
+    def apodise_fids(self, window='exponential', out=None, **kwargs):
+        """
+        Apply an apodisation window to all :class:`~nmrpy.data_objects.Fid` objects
+        owned by this :class:`~nmrpy.data_objects.FidArray`. The window is computed
+        once and applied to the whole :attr:`~nmrpy.data_objects.FidArray.data`
+        array in a single multiplication.
+
+        :keyword window: window name, see :meth:`~nmrpy.data_objects.Fid.apodise` for the windows and their parameters
+
+        :keyword out: writeable, C-contiguous array of the shape and dtype of :attr:`~nmrpy.data_objects.FidArray.data` into which the result is written, and which becomes the new data block; only available when all FIDs share a length and dtype. By default the data are modified in place
+        """
+        Fid._window_params(window, kwargs)
+        fids = self.get_fids()
+        data = self.data
+        if data is not self._data_block:
+            self._batch_out(out, None, None)
+            for fid in fids:
+                fid.apodise(window, **kwargs)
+            return
+        factors = [Fid._apodisation_window(window, data.shape[1], fid._params['sw_hz'], data.dtype, **kwargs)
+                   for fid in fids]
+        self._multiply_fids(fids, data, factors, out)
+
+    def _batch_out(self, out, shape, dtype):
+        """
+        Validate the preallocated output array of a batch transform, or allocate
+        one if out is None. out must be a writeable, C-contiguous array of the
+        given shape and dtype, and may be the current data block itself. Batch
+        transforms write into out and rebind each :class:`~nmrpy.data_objects.Fid`
+        to its rows, so no further copies are made. shape is None when the FIDs
+        do not share a data block, in which case out cannot be used.
+
+        Keyword arguments:
+        out -- preallocated array, or None
+        shape -- required shape
+        dtype -- required dtype
+        """
+        if shape is None:
+            if out is not None:
+                raise ValueError('out can only be used if all FIDs share a length and dtype.')
+            return None
+        if out is None:
+            return numpy.empty(shape, dtype=dtype)
+        if not isinstance(out, numpy.ndarray) or out.shape != tuple(shape) or out.dtype != dtype \
+            or not out.flags.c_contiguous or not out.flags.writeable:
+            raise ValueError('out must be a writeable C-contiguous array of shape {} and dtype {}.'.format(
+                tuple(shape), numpy.dtype(dtype)))
+        return out
+
+    def _multiply_fids(self, fids, data, factors, out=None):
+        """
+        Multiply each row of the data block by the corresponding factor, writing
+        into out (by default, in place where the product keeps the dtype of the
+        data) and rebinding the FIDs to its rows.
+
+        Keyword arguments:
+        fids -- the :class:`~nmrpy.data_objects.Fid` objects owning the rows of data
+        data -- the current data block
+        factors -- list of arrays, one per row; rows sharing a factor object are multiplied in a single call
+        out -- preallocated output array, or None
+        """
+        dtype = numpy.result_type(data, *factors[:1])
+        if out is None and dtype == data.dtype and data.flags.writeable:
+            out = data
+        out = self._batch_out(out, data.shape, dtype)
+        if all(factor is factors[0] for factor in factors):
+            numpy.multiply(data, factors[0], out=out)
+        else:
+            for row, factor, out_row in zip(data, factors, out):
+                numpy.multiply(row, factor, out=out_row)
+        if out is data:
+            for fid in fids:
+                fid._mark_dirty('data')
+        else:
+            self._set_data_block(out, fids)
+
+    def ft_fids(self, mp=True, cpus=None, batch=True):
+        """ 
+        Fourier-transform all FIDs.
+
+        :keyword mp: parallelise over multiple processors, significantly reducing computation time
+
+        :keyword cpus: defines number of CPUs to utilise if 'mp' is set to True
+
+        :keyword batch: transform the whole :attr:`~nmrpy.data_objects.FidArray.data` array in a single multithreaded call (see :meth:`~nmrpy.data_objects.Fid._ft_array`) when all FIDs share a length and file format
+        """
+        fids = self.get_fids()
+        key = self._cache_key('ft', fids, [[fid._file_format, fid._flags['ft']] for fid in fids])
+        if self._cache_restore(key, fids, ['data']):
+            for fid in fids:
+                fid._flags['ft'] = True
+            print('Fourier-transformation restored from cache')
+            return
+        data = self.data
+        file_formats = set(fid._file_format for fid in fids)
+        if batch and data is self._data_block and len(file_formats) == 1:
+            if any(fid._flags['ft'] for fid in fids):
+                raise ValueError('Data have already been Fourier Transformed.')
+            workers = 1
+            if mp:
+                workers = self._available_cpus() if cpus is None else cpus
+            # transformed in place unless the block is read-only
+            out = data if data.flags.writeable and data.dtype.kind == 'c' else None
+            self._set_data_block(Fid._ft_array(data, file_formats.pop(), workers=workers, out=out), fids)
+            for fid in fids:
+                fid._flags['ft'] = True
+        elif mp:
+            list_params = [[fid._file_format] for fid in fids]
+            ft_data = self._generic_mp_fids(Fid._ft, list_params, cpus, write_back=True)
+            self._set_fids_data(fids, ft_data)
+            for fid in fids:
                 fid._flags['ft'] = True
         else: 
             for fid in self.get_fids():
                 fid.ft()
+        self._cache_store(key, fids, ['data'])
         print('Fourier-transformation completed')
 
-    def real_fids(self):
+    def real_fids(self, out=None):
         """ 
         Discard imaginary component of FID data sets.
 
+        :keyword out: writeable, C-contiguous array of the shape of :attr:`~nmrpy.data_objects.FidArray.data` and its real dtype (e.g. float64 for complex128 data) into which the result is written, and which becomes the new data block; only available when all FIDs share a length and dtype
         """
-        for fid in self.get_fids():
-            fid.real()
+        data = self.data
+        if data is self._data_block:
+            out = self._batch_out(out, data.shape, data.real.dtype)
+            numpy.copyto(out, data.real)
+            self._set_data_block(out)
+        else:
+            self._batch_out(out, None, None)
+            for fid in self.get_fids():
+                fid.real()
 
     def norm_fids(self):
         """ 
         Normalise FIDs by maximum data value in :attr:`~nmrpy.data_objects.FidArray.data`.
 
         """
-        dmax = self.data.max()
-        for fid in self.get_fids():
-            fid.data = fid.data/dmax
+        data = self.data
+        dmax = data.max()
+        if data is self._data_block:
+            self._set_data_block(data/dmax)
+        else:
+            for fid in self.get_fids():
+                fid.data = fid.data/dmax
 
     def phase_correct_fids(self, method='leastsq', mp=True, cpus=None):
         """ 
@@ -1392,19 +2741,23 @@ class FidArray(Base):
 
         :keyword cpus: defines number of CPUs to utilise if 'mp' is set to True
         """
+        fids = self.get_fids()
+        key = self._cache_key('phase_correct', fids, [method, [fid._flags['ft'] for fid in fids]])
+        if self._cache_restore(key, fids, ['data']):
+            print('phase-correction restored from cache')
+            return
         if mp: 
-            fids = self.get_fids()
             if not all(fid.data.dtype in self._complex_dtypes for fid in fids):
                 raise TypeError('Only complex data can be phase-corrected.')
             if not all(fid._flags['ft'] for fid in fids):
                 raise ValueError('Only Fourier-transformed data can be phase-corrected.')
-            list_params = [[fid.data, method] for fid in fids]
-            phased_data = self._generic_mp(Fid._phase_correct, list_params, cpus)
-            for fid, datum in zip(fids, phased_data):
-                fid.data = datum
+            list_params = [[method] for fid in fids]
+            phased_data = self._generic_mp_fids(Fid._phase_correct, list_params, cpus, write_back=True)
+            self._set_fids_data(fids, phased_data)
         else:
             for fid in self.get_fids():
                 fid.phase_correct(method=method)
+        self._cache_store(key, fids, ['data'])
         print('phase-correction completed')
 
     def baseliner_fids(self):
@@ -1425,20 +2778,115 @@ Ctrl+Alt+Right - assign
 '''
         plot_title = 'Select data for baseline-correction'
         _baseliner_widget = FidArrayRangeSelector(self, title=plot_title, label=plot_label, voff=0.01)
+
+    def auto_baseliner_fids(self, width=0.02, thresh=3.0, combined=True):
+        """
+        Automatically select signal-free points for baseline-correction of all
+        :class:`~nmrpy.data_objects.Fid` objects owned by this :class:`~nmrpy.data_objects.FidArray`,
+        as an alternative to the :meth:`~nmrpy.data_objects.FidArray.baseliner_fids`
+        GUI widget. Selected points are stored in :attr:`~nmrpy.data_objects.Fid._bl_ppm`
+        (see :meth:`~nmrpy.data_objects.Fid.auto_baseliner`).
+
+        :keyword width: half-width in ppm of the window over which the derivative is averaged
+
+        :keyword thresh: number of standard deviations of the baseline derivative above which points are considered signal
+
+        :keyword combined: detect signal on the mean spectrum of the array, which has a higher signal-to-noise ratio, and select the same points for all FIDs (allowing :meth:`~nmrpy.data_objects.FidArray.baseline_correct_fids` to fit them together); otherwise points are selected for each FID separately
+        """
+        fids = self.get_fids()
+        if not all(fid._flags['ft'] for fid in fids):
+            raise ValueError('Only Fourier-transformed data can be baseline-corrected.')
+        data = self.data
+        if data is not self._data_block:
+            if combined:
+                raise ValueError('combined requires all FIDs to share a length.')
+            for fid in fids:
+                fid.auto_baseliner(width=width, thresh=thresh)
+            return
+        data = numpy.real(data)
+        half_width = fids[0]._width_to_points(width, data.shape[1])
+        if combined:
+            data = data.mean(axis=0)[numpy.newaxis]
+        masks = Fid._signal_free_points(data, half_width, thresh)
+        for i, fid in enumerate(fids):
+            fid._bl_ppm = fid._ppm[masks[0 if combined else i]]
   
-    def baseline_correct_fids(self, deg=2):
+    def baseline_correct_fids(self, deg=2, method='polynomial', lam=1e6, p=0.001, n_iter=10):
         """ 
         Apply baseline-correction to all :class:`~nmrpy.data_objects.Fid` objects owned by this :class:`~nmrpy.data_objects.FidArray`
 
         :keyword deg: degree of the baseline polynomial (see :meth:`~nmrpy.data_objects.Fid.baseline_correct`)
+
+        :keyword method: 'polynomial', fitted to the points selected with :meth:`~nmrpy.data_objects.FidArray.baseliner_fids`, or 'als' for automatic asymmetric least squares baselines (see :meth:`~nmrpy.data_objects.Fid.baseline_correct`)
+
+        :keyword lam: 'als': smoothness of the baseline (1e6)
+
+        :keyword p: 'als': asymmetry (0.001)
+
+        :keyword n_iter: 'als': maximum number of reweighting iterations (10)
         """
-        for fid in self.get_fids():
-            try:
-                fid.baseline_correct(deg=deg)
-            except:
-                print('failed for {}. Perhaps first run baseliner_fids()'.format(fid.id))
+        Fid._check_baseline_method(method, lam, p, n_iter)
+        fids = self.get_fids()
+        if method == 'als':
+            key = self._cache_key('baseline_correct', fids, [method, lam, p, n_iter])
+        else:
+            key = self._cache_key('baseline_correct', fids, [deg, [getattr(fid, '_bl_indices', None) for fid in fids]])
+        if self._cache_restore(key, fids, ['data', '_bl_poly']):
+            print('baseline-correction restored from cache')
+            return
+        data = self.data
+        indices = None
+        if method == 'polynomial':
+            indices = self._shared_bl_indices(fids)
+        if (method == 'als' or indices is not None) and data is self._data_block \
+            and data.dtype not in self._complex_dtypes:
+            if method == 'als':
+                baselines = Fid._als_baselines(data, lam, p, n_iter)
+            else:
+                baselines = Fid._polynomial_baselines(data, indices, deg)
+            # baselines are stored, and subtracted, at the precision of the data
+            if data.dtype.kind == 'f':
+                baselines = baselines.astype(data.dtype, copy=False)
+            for fid, baseline in zip(fids, baselines):
+                fid._bl_poly = baseline
+            if data.flags.writeable and numpy.result_type(data, baselines) == data.dtype:
+                data -= baselines
+                for fid in fids:
+                    fid._mark_dirty('data')
+            else:
+                # assigned through Fid.data, which converts to the FIDs' precision
+                self._set_fids_data(fids, list(data-baselines))
+                self._consolidate_data(fids)
+        else:
+            for fid in fids:
+                if method == 'als':
+                    # needs no baseline points, so failures are reported as they are
+                    fid.baseline_correct(method=method, lam=lam, p=p, n_iter=n_iter)
+                    continue
+                try:
+                    fid.baseline_correct(deg=deg, method=method, lam=lam, p=p, n_iter=n_iter)
+                except:
+                    print('failed for {}. Perhaps first run baseliner_fids()'.format(fid.id))
+        self._cache_store(key, fids, ['data', '_bl_poly'])
         print('baseline-correction completed')
 
+    @staticmethod
+    def _shared_bl_indices(fids):
+        """
+        Return the baseline indices (see :attr:`~nmrpy.data_objects.Fid._bl_ppm`)
+        if all fids share them, as they do after :meth:`~nmrpy.data_objects.FidArray.baseliner_fids`,
+        otherwise None.
+        """
+        if len(fids) == 0:
+            return None
+        try:
+            indices = [fid._bl_indices for fid in fids]
+        except AttributeError:
+            return None
+        if indices[0] is None or not all(i is not None and numpy.array_equal(i, indices[0]) for i in indices):
+            return None
+        return indices[0]
+
     @property
     def _data_traces(self):
         return self.__data_traces
@@ -1484,7 +2932,7 @@ Ctrl+Alt+Right - assign
     def integral_traces(self, integral_traces):
         self._integral_traces = integral_traces 
 
-    def deconv_fids(self, mp=True, cpus=None, method='leastsq', frac_gauss=0.0):
+    def deconv_fids(self, mp=True, cpus=None, method='leastsq', frac_gauss=0.0, cutoff=None):
         """ 
         Apply deconvolution to all :class:`~nmrpy.data_objects.Fid` objects owned by this :class:`~nmrpy.data_objects.FidArray`, using the :attr:`~nmrpy.data_objects.Fid.peaks` and  :attr:`~nmrpy.data_objects.Fid.ranges` attribute of each respective :class:`~nmrpy.data_objects.Fid`.
 
@@ -1493,18 +2941,29 @@ Ctrl+Alt+Right - assign
         :keyword mp: parallelise the phasing process over multiple processors, significantly reduces computation time
 
         :keyword cpus: defines number of CPUs to utilise if 'mp' is set to True, default is n-1 cores
+
+        :keyword cutoff: evaluate each peak only within this many linewidths of its offset (see :meth:`~nmrpy.data_objects.Fid.deconv`)
         """
+        Fid._check_cutoff(cutoff)
+        fids = self.get_fids()
+        key = None
+        if all(fid.peaks is not None and fid.ranges is not None for fid in fids):
+            key = self._cache_key('deconv', fids, [method, frac_gauss, cutoff,
+                [[fid._flags['ft'], fid._grouped_index_peaklist, fid._index_ranges] for fid in fids]])
+        if self._cache_restore(key, fids, ['_deconvoluted_peaks']):
+            print('deconvolution restored from cache')
+            return
         if mp: 
-            fids = self.get_fids()
             if not all(fid._flags['ft'] for fid in fids):
                 raise ValueError('Only Fourier-transformed data can be deconvoluted.')
-            list_params = [[fid.data, fid._grouped_index_peaklist, fid._index_ranges, frac_gauss, method] for fid in fids]
-            deconv_datum = self._generic_mp(Fid._deconv_datum, list_params, cpus)
+            list_params = [[fid._grouped_index_peaklist, fid._index_ranges, frac_gauss, method, cutoff] for fid in fids]
+            deconv_datum = self._generic_mp_fids(Fid._deconv_datum, list_params, cpus)
             for fid, datum in zip(fids, deconv_datum):
                 fid._deconvoluted_peaks = numpy.array([j for i in datum for j in i])
         else:
             for fid in self.get_fids():
-                fid.deconv(frac_gauss=frac_gauss)
+                fid.deconv(frac_gauss=frac_gauss, cutoff=cutoff)
+        self._cache_store(key, fids, ['_deconvoluted_peaks'])
         print('deconvolution completed')
 
     def get_masked_integrals(self):
@@ -1525,27 +2984,300 @@ Ctrl+Alt+Right - assign
         return result
 
 
-    def ps_fids(self, p0=0.0, p1=0.0):
+    def ps_fids(self, p0=0.0, p1=0.0, out=None):
         """
         Apply manual phase-correction to all :class:`~nmrpy.data_objects.Fid` objects owned by this :class:`~nmrpy.data_objects.FidArray`
 
         :keyword p0: Zero order phase in degrees
 
         :keyword p1: First order phase in degrees
+
+        :keyword out: writeable, C-contiguous array of the shape and dtype of :attr:`~nmrpy.data_objects.FidArray.data` into which the result is written, and which becomes the new data block; only available when all FIDs share a length and dtype. By default the data are modified in place
         """
-        for fid in self.get_fids():
-            fid.ps(p0=p0, p1=p1)  
+        fids = self.get_fids()
+        data = self.data
+        if data is not self._data_block:
+            self._batch_out(out, None, None)
+            for fid in fids:
+                fid.ps(p0=p0, p1=p1)
+            return
+        if not all(isinstance(i, (float, int)) for i in [p0, p1]):
+            raise TypeError('p0 and p1 must be floats or ints.')
+        if not data.dtype in Fid._complex_dtypes:
+            raise TypeError('data must be complex.')
+        ramp = Fid._phase_ramp(data.shape[1], p0*numpy.pi/180.0, p1*numpy.pi/180.0, data.dtype)
+        self._multiply_fids(fids, data, [ramp]*len(fids), out)
 
     @staticmethod
-    def _generic_mp(fcn, iterable, cpus):
+    def _available_cpus():
+        """
+        Number of CPUs available to this process, respecting the CPU affinity
+        mask and any cgroup CPU quota (e.g. in containers).
+        """
+        try:
+            cpus = len(os.sched_getaffinity(0))
+        except AttributeError:
+            cpus = cpu_count()
+        quota_files = [
+            ['/sys/fs/cgroup/cpu.max'],
+            ['/sys/fs/cgroup/cpu/cpu.cfs_quota_us', '/sys/fs/cgroup/cpu/cpu.cfs_period_us'],
+            ]
+        for files in quota_files:
+            try:
+                values = []
+                for f in files:
+                    with open(f) as fh:
+                        values += fh.read().split()
+                quota, period = int(values[0]), int(values[1])
+            except (OSError, ValueError, IndexError):
+                continue
+            if quota > 0 and period > 0:
+                cpus = min(cpus, max(1, quota//period))
+            break
+        return cpus
+
+    def start_pool(self, cpus=None, chunksize=None):
+        """
+        Start a persistent pool of worker processes used by the multiprocessing
+        methods of this :class:`~nmrpy.data_objects.FidArray` (e.g.
+        :meth:`~nmrpy.data_objects.FidArray.phase_correct_fids`). The pool is
+        otherwise started on first use and kept until
+        :meth:`~nmrpy.data_objects.FidArray.close_pool` is called, or the
+        :class:`~nmrpy.data_objects.FidArray` is used as a context manager and the
+        block exits. Any running pool is closed first.
+
+        :keyword cpus: number of worker processes, default is n-1 available cores (at least 1)
+
+        :keyword chunksize: number of FIDs sent to a worker at a time, default is chosen by :meth:`multiprocessing.pool.Pool.map`
+        """
+        self.close_pool()
         if cpus is None:
-            cpus = cpu_count()-1
-        proc_pool = Pool(cpus)
-        result = proc_pool.map(fcn, iterable)
-        proc_pool.close()
-        proc_pool.join()
+            cpus = max(1, self._available_cpus()-1)
+        if not isinstance(cpus, int) or cpus < 1:
+            raise ValueError('cpus must be a positive integer.')
+        if chunksize is not None and (not isinstance(chunksize, int) or chunksize < 1):
+            raise ValueError('chunksize must be a positive integer or None.')
+        self._pool = Pool(cpus)
+        self._pool_cpus = cpus
+        self._pool_chunksize = chunksize
+        self._pool_finalizer = weakref.finalize(self, self._pool.terminate)
+        return self._pool
+
+    def close_pool(self):
+        """
+        Shut down the worker pool started by :meth:`~nmrpy.data_objects.FidArray.start_pool`, if any.
+        """
+        if self._pool is not None:
+            self._pool_finalizer.detach()
+            self._pool.close()
+            self._pool.join()
+        self._pool = None
+        self._pool_cpus = None
+
+    def process_fids(self, pipeline, mp=True, cpus=None):
+        """
+        Apply a :class:`~nmrpy.data_objects.Pipeline` of processing stages to all
+        :class:`~nmrpy.data_objects.Fid` objects owned by this :class:`~nmrpy.data_objects.FidArray`.
+        The whole chain is applied to each FID in turn (in one worker process if
+        mp is True), so the data are passed to the workers only once.
+
+        :arg pipeline: a :class:`~nmrpy.data_objects.Pipeline`, or a list of stages
+                       from which to build one
+
+        :keyword mp: parallelise over multiple processors
+
+        :keyword cpus: defines number of CPUs to utilise if 'mp' is set to True
+        """
+        if not isinstance(pipeline, Pipeline):
+            pipeline = Pipeline(pipeline)
+        fids = self.get_fids()
+        fused_stages = pipeline._fused_stages()
+        list_params = []
+        for fid in fids:
+            state = dict(
+                id=fid.id,
+                file_format=fid._file_format,
+                params=fid._params,
+                precision=fid.precision,
+                ft=fid._flags['ft'],
+                peaks=fid.peaks,
+                ranges=fid.ranges,
+                bl_ppm=getattr(fid, '_bl_ppm', None),
+                )
+            list_params.append([fused_stages, state])
+        if mp:
+            results = self._generic_mp_fids(Pipeline._run_datum, list_params, cpus)
+        else:
+            results = [Pipeline._run_datum([fid.data]+params) for fid, params in zip(fids, list_params)]
+        data = [result['data'] for result in results]
+        layouts = set((numpy.dtype(fid._precision_dtype(datum) or datum.dtype), datum.shape)
+                      for fid, datum in zip(fids, data))
+        if len(layouts) == 1:
+            # results are copied once, straight into the new data block
+            dtype, shape = layouts.pop()
+            block = numpy.empty((len(fids),)+shape, dtype=dtype)
+            for row, datum in zip(block, data):
+                row[...] = datum
+            self._set_data_block(block, fids)
+        else:
+            for fid, datum in zip(fids, data):
+                fid.data = datum
+        for fid, result in zip(fids, results):
+            fid._flags['ft'] = result['ft']
+            fid._bl_ppm = result['bl_ppm']
+            if result['bl_poly'] is not None:
+                fid._bl_poly = result['bl_poly']
+            if result['deconvoluted_peaks'] is not None:
+                fid._deconvoluted_peaks = result['deconvoluted_peaks']
+        print('processing completed')
+
+    def enable_cache(self, directory='.nmrpy_cache', max_size=2**30):
+        """
+        Cache the results of :meth:`~nmrpy.data_objects.FidArray.ft_fids`,
+        :meth:`~nmrpy.data_objects.FidArray.phase_correct_fids`,
+        :meth:`~nmrpy.data_objects.FidArray.baseline_correct_fids` and
+        :meth:`~nmrpy.data_objects.FidArray.deconv_fids` on disk. Results are keyed
+        by a hash of the input data and the stage parameters, so re-running an
+        identical stage (e.g. when re-executing a notebook) restores its results
+        instead of recomputing them. The cache may be shared between FidArrays and
+        sessions.
+
+        :keyword directory: directory in which results are stored
+
+        :keyword max_size: maximum total size of the cache in bytes; the least
+                           recently used results are removed beyond it (1 GiB)
+        """
+        self._stage_cache = _StageCache(directory, max_size=max_size)
+
+    def disable_cache(self):
+        """
+        Stop caching processing results (see :meth:`~nmrpy.data_objects.FidArray.enable_cache`).
+        Results already stored are kept on disk.
+        """
+        self._stage_cache = None
+
+    def _cache_key(self, stage, fids, params):
+        """
+        Return the cache key of a processing stage applied to fids, or None if
+        caching is disabled.
+
+        Keyword arguments:
+        stage -- name of the processing stage
+        fids -- the :class:`~nmrpy.data_objects.Fid` objects processed
+        params -- all other inputs that determine the result
+        """
+        if self._stage_cache is None:
+            return None
+        return self._stage_cache.key(stage, [fid.data for fid in fids], params)
+
+    def _cache_restore(self, key, fids, attrs):
+        """
+        Set attrs of each of fids from the cached results stored under key.
+        Returns True on a cache hit.
+        """
+        if key is None:
+            return False
+        results = self._stage_cache.get(key)
+        if results is None:
+            return False
+        if 'data' in attrs:
+            data = results['data']
+            if len(set((datum.shape, datum.dtype) for datum in data)) == 1:
+                self._set_data_block(numpy.array(data), fids)
+            else:
+                self._set_fids_data(fids, data)
+        for attr in attrs:
+            if attr == 'data':
+                continue
+            for fid, value in zip(fids, results[attr]):
+                if value is not None:
+                    setattr(fid, attr, value)
+        return True
+
+    def _cache_store(self, key, fids, attrs):
+        """
+        Store attrs of each of fids in the cache under key.
+        """
+        if key is None:
+            return
+        self._stage_cache.put(key, {attr: [getattr(fid, attr, None) for fid in fids] for attr in attrs})
+
+    def _generic_mp(self, fcn, iterable, cpus):
+        if self._pool is None or (cpus is not None and cpus != self._pool_cpus):
+            self.start_pool(cpus=cpus, chunksize=self._pool_chunksize)
+        return self._pool.map(fcn, iterable, chunksize=self._pool_chunksize)
+
+    def _generic_mp_fids(self, fcn, list_params, cpus, write_back=False):
+        """
+        Map fcn over all :class:`~nmrpy.data_objects.Fid` objects using the worker
+        pool. fcn is called with [<fid data>]+params, where params is the entry in
+        list_params corresponding to each FID in :meth:`~nmrpy.data_objects.FidArray.get_fids`.
+
+        If the FIDs share a data block, it is copied once into shared memory and
+        workers read (and, if write_back is True, overwrite) their rows in place,
+        so that only small descriptors are pickled. With write_back, fcn must
+        return an array of the same length as its data, and the results are
+        written back into the data block, which is returned; otherwise a list of
+        results is returned.
+        """
+        fids = self.get_fids()
+        data = self.data
+        if data is not self._data_block or data.size == 0:
+            iterable = [[fid.data]+list(params) for fid, params in zip(fids, list_params)]
+            return self._generic_mp(fcn, iterable, cpus)
+        shm = shared_memory.SharedMemory(create=True, size=data.nbytes)
+        shared = numpy.ndarray(data.shape, dtype=data.dtype, buffer=shm.buf)
+        try:
+            shared[:] = data
+            descriptor = (shm.name, data.shape, data.dtype.str, write_back)
+            iterable = [[fcn, descriptor, i, params] for i, params in enumerate(list_params)]
+            result = self._generic_mp(FidArray._shared_mp_worker, iterable, cpus)
+            if write_back:
+                # copy the results back into the data block rather than into a
+                # new array, so that at most two copies of the data are held
+                if data.flags.writeable:
+                    data[...] = shared
+                    result = data
+                else:
+                    result = shared.copy()
+        finally:
+            del shared
+            shm.close()
+            shm.unlink()
+        return result
+
+    @staticmethod
+    def _shared_mp_worker(list_params):
+        """
+        Worker for :meth:`~nmrpy.data_objects.FidArray._generic_mp_fids`. Applies
+        fcn to one row of a data block in shared memory.
+        list_params is a list of [<fcn>, <shared memory descriptor>, <row index>, <params>].
+        """
+        fcn, descriptor, index, params = list_params
+        name, shape, dtype, write_back = descriptor
+        shm = shared_memory.SharedMemory(name=name)
+        data = numpy.ndarray(shape, dtype=dtype, buffer=shm.buf)
+        try:
+            result = fcn([data[index]]+list(params))
+            if write_back:
+                data[index] = result
+                result = None
+        finally:
+            del data
+            shm.close()
         return result
 
+    def _set_fids_data(self, fids, data):
+        """
+        Assign data, either a 2D array or a list with one dataset per
+        :class:`~nmrpy.data_objects.Fid` in fids, sharing a single data block where possible.
+        """
+        if isinstance(data, numpy.ndarray) and data.ndim == 2:
+            self._set_data_block(data, fids)
+        else:
+            for fid, datum in zip(fids, data):
+                fid.data = datum
+
 
     def plot_array(self, **kwargs):
         """
@@ -1611,6 +3343,7 @@ Ctrl+Alt+Right - assign
 
         :keyword elev: elevation of 3D axes (20)
 
+        :keyword cutoff: only evaluate each deconvoluted peak within this many linewidths of its offset (None)
 
         """
         plt = Plot()
@@ -1813,29 +3546,718 @@ Ctrl+Alt+Right - assign
             integrals_set[i] = integrals    
         return integrals_set
 
-    def save_to_file(self, filename=None):
+    # Project files are directories holding the spectra as chunks of rows
+    # (data/*.npy, or data/*.npz when compressed), the peaks, ranges and
+    # deconvoluted peaks of all FIDs as flat arrays with per-FID counts, and the
+    # remaining (small) attributes pickled in project.pkl.
+    _project_version = 1
+    _project_index = 'project.pkl'
+    _project_columns = {
+        'peaks': '_peaks',
+        'ranges': '_ranges',
+        'deconvoluted_peaks': '_Fid__deconvoluted_peaks',
+        'bl_ppm': '_Fid__bl_ppm',
+        'bl_poly': '_Fid__bl_poly',
+        }
+
+    def save_to_file(self, filename=None, chunk_size=64, compress=False, incremental=False):
         """
         Save :class:`~nmrpy.data_objects.FidArray` object to file, including all objects owned.
 
+        The project is written as a directory in which the spectral data are stored
+        in chunks of FIDs, separately from the peaks, ranges, deconvolution results
+        and parameters. Single FIDs or ppm windows can therefore be read without
+        loading the whole project, see :meth:`~nmrpy.data_objects.FidArray.from_path`
+        and :meth:`~nmrpy.data_objects.FidArray.read_project_data`.
+
         :keyword filename: filename to save :class:`~nmrpy.data_objects.FidArray` to
 
+        :keyword chunk_size: number of FIDs per data chunk (64)
+
+        :keyword compress: compress the data chunks (False); uncompressed chunks
+                           allow ppm windows to be read without reading whole FIDs
+
+        :keyword incremental: if this object was last saved to, or loaded from,
+                              filename, only rewrite the data chunks, peaks, ranges
+                              and deconvolution results that have since been
+                              modified. Falls back to a full save if the FIDs or the
+                              chunk layout have changed. Data modified in place
+                              (rather than assigned) are not detected.
+
         """
         if filename is None:
             filename = 'data.nmrpy'
         if not isinstance(filename, str):
             raise TypeError('filename must be a string.')
+        if not isinstance(chunk_size, int) or chunk_size < 1:
+            raise ValueError('chunk_size must be a positive integer.')
         #delete all matplotlib plots to reduce file size
         self._del_plots()
-        for fid in self.get_fids():
+        fids = self.get_fids()
+        for fid in fids:
             fid._del_plots()
-        with open(filename, 'wb') as f:
-            pickle.dump(self, f)
+
+        if not self._data_block_is_current(fids):
+            self._consolidate_data(fids)
+        block = self._data_block
+        if block is not None:
+            chunk_rows = [min(chunk_size, len(fids)-i) for i in range(0, len(fids), chunk_size)]
+        else:
+            # FIDs of differing length or dtype are stored one per chunk
+            chunk_rows = [1]*len(fids)
+        index = {
+            'version': self._project_version,
+            'compress': compress,
+            'chunk_rows': chunk_rows,
+            'row_lengths': [len(fid.data) for fid in fids],
+            'ids': [fid.id for fid in fids],
+            }
+
+        full = True
+        if incremental and self._project_path == os.path.abspath(filename) and self._is_project(filename):
+            previous = self._read_project_index(filename)
+            full = any(previous.get(key) != index[key] for key in ['compress', 'chunk_rows', 'ids'])
+        if full:
+            # a full save is written next to filename and only replaces the previous
+            # project once complete, so a failed save leaves it intact
+            self._check_project_path(filename)
+            target = os.path.abspath(filename)
+            path = tempfile.mkdtemp(prefix='.'+os.path.basename(target)+'-', dir=os.path.dirname(target))
+            try:
+                os.makedirs(os.path.join(path, 'data'))
+                self._write_project(path, fids, block, index, full)
+                self._replace_project_path(path, filename)
+            except BaseException:
+                shutil.rmtree(path, ignore_errors=True)
+                raise
+        else:
+            self._write_project(filename, fids, block, index, full)
+        for fid in fids:
+            fid._dirty = frozenset()
+        self._project_path = os.path.abspath(filename)
+
+    def _write_project(self, path, fids, block, index, full):
+        """
+        Write the data chunks, columns and index of a project into the directory
+        path, see :meth:`~nmrpy.data_objects.FidArray.save_to_file`.
+
+        Keyword arguments:
+        path -- project directory, containing a 'data' directory
+        fids -- the :class:`~nmrpy.data_objects.Fid` objects to save
+        block -- the data block, or None if the FIDs do not share one
+        index -- the project index, completed and written last
+        full -- write everything rather than only what has been modified
+        """
+        chunk_rows = index['chunk_rows']
+        compress = index['compress']
+        start = 0
+        for i, rows in enumerate(chunk_rows):
+            chunk_fids = fids[start:start+rows]
+            if full or any('data' in fid._dirty for fid in chunk_fids):
+                if block is not None:
+                    chunk = block[start:start+rows]
+                else:
+                    chunk = numpy.atleast_2d(chunk_fids[0].data)
+                chunk_path = os.path.join(path, 'data', '%06i'%i)
+                if compress:
+                    numpy.savez_compressed(chunk_path, data=chunk)
+                else:
+                    numpy.save(chunk_path, chunk)
+            start += rows
+
+        fid_states = [fid.__getstate__() for fid in fids]
+        for state in fid_states:
+            state.pop('_Fid__data', None)
+            state.pop('_dirty', None)
+        for column, attr in self._project_columns.items():
+            values = [state.pop(attr, None) for state in fid_states]
+            # columns missing from projects saved by older versions are always written
+            if not full and not any(column in fid._dirty for fid in fids) and \
+               os.path.isfile(os.path.join(path, column+'.npy')):
+                continue
+            counts = numpy.array([-1 if v is None else len(v) for v in values], dtype=int)
+            values = [numpy.asarray(v) for v in values if v is not None and len(v) > 0]
+            flat = numpy.concatenate(values) if len(values) > 0 else numpy.array([])
+            numpy.save(os.path.join(path, column+'.npy'), flat)
+            numpy.save(os.path.join(path, column+'_counts.npy'), counts)
+
+        # the remaining attributes (ids, flags and acquisition parameters) are
+        # small and always rewritten; per-FID arrays are stored as columns above
+        index['fid_array'] = {k: v for k, v in self.__getstate__().items()
+                              if not isinstance(v, (Fid, Plot))}
+        index['fids'] = fid_states
+        with open(os.path.join(path, self._project_index), 'wb') as f:
+            pickle.dump(index, f)
+
+    @classmethod
+    def _check_project_path(cls, filename):
+        """
+        Check that filename can be overwritten by a saved project. Directories
+        that are not projects are left alone.
+
+        Keyword arguments:
+        filename -- path of the project
+        """
+        if os.path.isdir(filename) and not cls._is_project(filename):
+            raise OSError('{} is a directory but not an NMRPy project.'.format(filename))
+
+    @classmethod
+    def _replace_project_path(cls, path, filename):
+        """
+        Move the project written to path to filename. A previously saved project
+        (or pickled file) at filename is moved aside first and only removed once
+        the new project is in place.
+
+        Keyword arguments:
+        path -- path of the newly written project
+        filename -- path of the project
+        """
+        old = None
+        if os.path.lexists(filename):
+            old = path+'.old'
+            os.rename(filename, old)
+        try:
+            os.rename(path, filename)
+        except BaseException:
+            if old is not None:
+                os.rename(old, filename)
+            raise
+        if old is None:
+            return
+        if os.path.isdir(old) and not os.path.islink(old):
+            shutil.rmtree(old)
+        else:
+            os.remove(old)
+
+    @classmethod
+    def _is_project(cls, path):
+        return isinstance(path, str) and os.path.isfile(os.path.join(path, cls._project_index))
+
+    @classmethod
+    def _read_project_index(cls, filename):
+        with open(os.path.join(filename, cls._project_index), 'rb') as f:
+            index = pickle.load(f)
+        if index['version'] > cls._project_version:
+            raise IOError('Project was saved by a newer version of NMRPy.')
+        return index
+
+    @classmethod
+    def _read_project_rows(cls, filename, index, rows, columns=slice(None)):
+        """
+        Read the given rows of the stored data, opening only the chunks that
+        contain them. Returns a list of arrays, one per row.
+
+        Keyword arguments:
+        filename -- path of the project
+        index -- the project index (from _read_project_index)
+        rows -- sequence of FID indices
+        columns -- slice of data points to read from each row
+        """
+        starts = numpy.cumsum([0]+index['chunk_rows'])
+        chunk_indices = numpy.searchsorted(starts, rows, side='right') - 1
+        data = [None]*len(rows)
+        for chunk_index in numpy.unique(chunk_indices):
+            path = os.path.join(filename, 'data', '%06i'%chunk_index)
+            if index['compress']:
+                with numpy.load(path+'.npz') as f:
+                    chunk = f['data']
+            else:
+                chunk = numpy.load(path+'.npy', mmap_mode='r')
+            for i in numpy.flatnonzero(chunk_indices == chunk_index):
+                data[i] = numpy.array(chunk[rows[i]-starts[chunk_index], columns])
+        return data
+
+    @classmethod
+    def _from_project(cls, filename, indices=None):
+        """
+        Instantiate a new :class:`~nmrpy.data_objects.FidArray` from a project
+        directory written by :meth:`~nmrpy.data_objects.FidArray.save_to_file`.
+
+        Keyword arguments:
+        filename -- path of the project
+        indices -- slice or sequence of FID indices to load (default all)
+        """
+        index = cls._read_project_index(filename)
+        fid_states = index['fids']
+        rows = numpy.arange(len(fid_states))
+        if indices is not None:
+            rows = numpy.atleast_1d(rows[indices])
+
+        columns = {}
+        for column, attr in cls._project_columns.items():
+            if not os.path.isfile(os.path.join(filename, column+'_counts.npy')):
+                # projects saved by older versions keep these in the index
+                continue
+            counts = numpy.load(os.path.join(filename, column+'_counts.npy'))
+            flat = numpy.load(os.path.join(filename, column+'.npy'), mmap_mode='r')
+            offsets = numpy.cumsum(numpy.concatenate([[0], numpy.maximum(counts, 0)]))
+            columns[attr] = [None if counts[i] < 0 else numpy.array(flat[offsets[i]:offsets[i+1]])
+                             for i in rows]
+
+        fid_array = cls.__new__(cls)
+        fid_array.__dict__.update(index['fid_array'])
+        fids = []
+        for i, row in enumerate(rows):
+            fid = Fid.__new__(Fid)
+            fid.__dict__.update(fid_states[row])
+            if fid._source_index is None:
+                fid._source_index = int(row)
+            for attr, values in columns.items():
+                setattr(fid, attr, values[i])
+            fid._bind_data(None, dirty=False)
+            fid_array.add_fid(fid)
+            fids.append(fid)
+        data = cls._read_project_rows(filename, index, rows)
+        if len(set((datum.shape, datum.dtype) for datum in data)) == 1:
+            fid_array._set_data_block(numpy.array(data), fids, dirty=False)
+        else:
+            for fid, datum in zip(fids, data):
+                fid._bind_data(datum, dirty=False)
+        if indices is None:
+            fid_array._project_path = os.path.abspath(filename)
+        return fid_array
+
+    @classmethod
+    def read_project_data(cls, filename, indices=None, ppm=None):
+        """
+        Read spectral data directly from a project saved with
+        :meth:`~nmrpy.data_objects.FidArray.save_to_file`, without loading the
+        rest of the project. Returns a 2D array (FIDs x data points).
+
+        :arg filename: path of the project
+
+        :keyword indices: a slice or sequence of FID indices to read (default all)
+
+        :keyword ppm: [upper, lower] ppm window to read; requires Fourier-transformed
+                      data of equal length (default whole spectrum)
+        """
+        index = cls._read_project_index(filename)
+        fid_states = index['fids']
+        rows = numpy.arange(len(fid_states))
+        if indices is not None:
+            rows = numpy.atleast_1d(rows[indices])
+        columns = slice(None)
+        if ppm is not None:
+            if len(rows) == 0:
+                return numpy.array([])
+            params = fid_states[rows[0]].get('_Base__params')
+            if params is None:
+                raise AttributeError('ppm windows require acquisition parameters.')
+            lengths = set(index['row_lengths'][row] for row in rows)
+            if len(lengths) != 1:
+                raise ValueError('ppm windows require FIDs of equal length.')
+            n = lengths.pop()
+            axis = numpy.linspace(params['sw_left']-params['sw'], params['sw_left'], n)[::-1]
+            upper, lower = max(ppm), min(ppm)
+            inside = numpy.flatnonzero((axis <= upper) & (axis >= lower))
+            if len(inside) == 0:
+                raise ValueError('ppm window lies outside the spectral width.')
+            columns = slice(inside[0], inside[-1]+1)
+        return numpy.array(cls._read_project_rows(filename, index, rows, columns))
   
+class Pipeline():
+    """
+    A sequence of :class:`~nmrpy.data_objects.Fid` processing stages that is run
+    over all FIDs of a :class:`~nmrpy.data_objects.FidArray` by
+    :meth:`~nmrpy.data_objects.FidArray.process_fids`. Eg.::
+
+        pipeline = Pipeline([
+            ('emhz', {'lb': 5.0}),
+            ('ft', {}),
+            ('phase_correct', {'method': 'leastsq'}),
+            ('real', {}),
+            ('deconv', {'frac_gauss': 0.0}),
+            ])
+        fid_array.process_fids(pipeline)
+
+    Each stage is a :class:`~nmrpy.data_objects.Fid` method name and its keyword
+    arguments. The whole chain is applied to each FID in a single worker, rather
+    than one pool round-trip per stage, and consecutive elementwise stages
+    (:meth:`~nmrpy.data_objects.Fid.emhz`, :meth:`~nmrpy.data_objects.Fid.ps` and
+    :meth:`~nmrpy.data_objects.Fid.real`) are fused into a single pass over the
+    data. Pipelines can be stored as configuration using
+    :meth:`~nmrpy.data_objects.Pipeline.to_config`.
+    """
+
+    _stages = ['zf', 'emhz', 'apodise', 'ft', 'ps', 'phase_correct', 'real', 'auto_baseliner',
+               'baseline_correct', 'deconv']
+    _elementwise_stages = ['emhz', 'apodise', 'ps', 'real']
+
+    def __init__(self, stages):
+        """
+        :arg stages: a list of (stage name, keyword arguments) tuples
+        """
+        self.stages = stages
+
+    def __repr__(self):
+        return 'Pipeline({})'.format(self.stages)
+
+    @property
+    def stages(self):
+        """
+        The list of (stage name, keyword arguments) tuples applied in order.
+        """
+        return self.__stages
+
+    @stages.setter
+    def stages(self, stages):
+        if not Base._is_iter(stages) or isinstance(stages, str):
+            raise TypeError('stages must be a list of (stage name, keyword arguments) tuples.')
+        validated = []
+        for stage in stages:
+            if isinstance(stage, str):
+                stage = (stage, {})
+            if len(stage) != 2 or not isinstance(stage[1], dict):
+                raise TypeError('stages must be a list of (stage name, keyword arguments) tuples.')
+            name, kwargs = stage
+            if name not in self._stages:
+                raise ValueError('{} is not a pipeline stage; use one of {}.'.format(name, self._stages))
+            # raises TypeError for unknown keyword arguments
+            inspect.signature(getattr(Fid, name)).bind(None, **kwargs)
+            if name == 'apodise':
+                kwargs = dict(kwargs)
+                Fid._window_params(kwargs.pop('window', 'exponential'), kwargs)
+            validated.append((name, dict(kwargs)))
+        self.__stages = validated
+
+    def to_config(self):
+        """
+        Return the pipeline as a list of dictionaries, suitable for storing as JSON.
+        """
+        return [dict(stage=name, **kwargs) for name, kwargs in self.stages]
+
+    @classmethod
+    def from_config(cls, config):
+        """
+        Instantiate a :class:`~nmrpy.data_objects.Pipeline` from a configuration
+        returned by :meth:`~nmrpy.data_objects.Pipeline.to_config`.
+
+        :arg config: a list of dictionaries, each with a 'stage' key naming the stage
+                     and its keyword arguments
+        """
+        stages = []
+        for stage in config:
+            kwargs = dict(stage)
+            stages.append((kwargs.pop('stage'), kwargs))
+        return cls(stages)
+
+    def _fused_stages(self):
+        """
+        Return the stages with consecutive elementwise stages grouped, as a list of
+        (stage name, keyword arguments) tuples and lists of such tuples. A group
+        ends after 'real', which must be applied last.
+        """
+        fused = []
+        group = []
+        for stage in self.stages:
+            if stage[0] in self._elementwise_stages:
+                group.append(stage)
+                if stage[0] != 'real':
+                    continue
+            if len(group) > 0:
+                fused.append(group)
+                group = []
+            if stage[0] not in self._elementwise_stages:
+                fused.append(stage)
+        if len(group) > 0:
+            fused.append(group)
+        return fused
+
+    @classmethod
+    def _run_datum(cls, list_params):
+        """
+        Class method for running a pipeline over a single FID using multiprocessing.
+        list_params is a list of [<data>, <fused stages>, <fid state>], where the
+        state holds the attributes of the FID that the stages use. Returns a
+        dictionary of the resulting data, flags, baseline and deconvoluted peaks.
+        """
+        data, fused_stages, state = list_params
+        fid = Fid(id=state['id'], data=data)
+        fid._file_format = state['file_format']
+        fid._params = state['params']
+        fid._precision = state['precision']
+        fid._flags['ft'] = state['ft']
+        fid.peaks = state['peaks']
+        fid.ranges = state['ranges']
+        fid._bl_ppm = state['bl_ppm']
+        for stage in fused_stages:
+            if isinstance(stage, list):
+                cls._run_elementwise(fid, stage)
+            else:
+                name, kwargs = stage
+                getattr(fid, name)(**kwargs)
+        return dict(
+            data=fid.data,
+            ft=fid._flags['ft'],
+            bl_ppm=fid._bl_ppm,
+            bl_poly=getattr(fid, '_bl_poly', None),
+            deconvoluted_peaks=fid._deconvoluted_peaks,
+            )
+
+    @staticmethod
+    def _stage_arguments(name, kwargs):
+        """
+        Return the keyword arguments of a stage with the defaults of the
+        corresponding :class:`~nmrpy.data_objects.Fid` method filled in, so that
+        fused stages use the same defaults as the methods themselves.
+
+        Keyword arguments:
+        name -- stage name
+        kwargs -- keyword arguments given for the stage
+        """
+        signature = inspect.signature(getattr(Fid, name))
+        bound = signature.bind_partial(None, **kwargs)
+        bound.apply_defaults()
+        arguments = {}
+        for key, parameter in list(signature.parameters.items())[1:]:
+            if parameter.kind == parameter.VAR_KEYWORD:
+                arguments.update(bound.arguments[key])
+            else:
+                arguments[key] = bound.arguments[key]
+        return arguments
+
+    @staticmethod
+    def _run_elementwise(fid, stages):
+        """
+        Apply a group of elementwise stages to fid in a single pass: the emhz,
+        apodise and ps windows are multiplied together first, and a final 'real' only
+        computes the real part of the product.
+
+        Keyword arguments:
+        fid -- the :class:`~nmrpy.data_objects.Fid` to process
+        stages -- list of (stage name, keyword arguments) tuples
+        """
+        data = fid.data
+        size = len(data)
+        window = None
+        real = False
+        for name, kwargs in stages:
+            kwargs = Pipeline._stage_arguments(name, kwargs)
+            if name == 'emhz':
+                factor = Fid._emhz_window(size, kwargs['lb'], fid._params['sw_hz'], data.dtype)
+            elif name == 'apodise':
+                window_name = kwargs.pop('window')
+                factor = Fid._apodisation_window(window_name, size, fid._params['sw_hz'], data.dtype, **kwargs)
+            elif name == 'ps':
+                p0 = kwargs['p0']
+                p1 = kwargs['p1']
+                if not all(isinstance(i, (float, int)) for i in [p0, p1]):
+                    raise TypeError('p0 and p1 must be floats or ints.')
+                if not data.dtype in Fid._complex_dtypes:
+                    raise TypeError('data must be complex.')
+                factor = Fid._phase_ramp(size, p0*numpy.pi/180.0, p1*numpy.pi/180.0, data.dtype)
+            else:
+                real = True
+                continue
+            window = factor if window is None else window*factor
+        if window is None:
+            result = numpy.real(data)
+        elif real and data.dtype.kind == 'c':
+            if window.dtype.kind == 'c':
+                # the real part of window*data, without forming the complex product
+                result = window.real*data.real
+                result -= window.imag*data.imag
+            else:
+                result = window*data.real
+        else:
+            result = window*data
+            if real:
+                result = numpy.real(result)
+        fid.data = result
+
+class _MappedFidData():
+    """
+    Read-only sequence of the FIDs stored in a .fid directory. The binary file is
+    memory-mapped rather than read, and each FID is only decoded when it is
+    indexed, so importing a large arrayed experiment costs no more than parsing
+    its parameters.
+    """
+
+    def __init__(self, rows, decode):
+        """
+        Keyword arguments:
+        rows -- memory-mapped raw data; all but the last axis index the FIDs
+        decode -- function converting one raw row into complex FID data
+        """
+        self._rows = rows
+        self._decode = decode
+
+    def __len__(self):
+        return int(numpy.prod(self._rows.shape[:-1]))
+
+    def __getitem__(self, index):
+        if not 0 <= index < len(self):
+            raise IndexError('FID index out of range.')
+        row = self._rows[numpy.unravel_index(index, self._rows.shape[:-1])]
+        return self._decode(numpy.array(row))
+
+    def loader(self, index):
+        """
+        Return a function that decodes the FID at index when called.
+        """
+        return lambda: self[index]
+
+    @classmethod
+    def from_varian(cls, fid_path):
+        """
+        Map a Varian .fid directory, returning the parameter dictionary (as
+        returned by :func:`nmrglue.varian.read`) and the mapped data.
+        """
+        procpar = nmrglue.varian.read_procpar(os.path.join(fid_path, 'procpar'))
+        filename = os.path.join(fid_path, 'fid')
+        with open(filename, 'rb') as f:
+            dic = nmrglue.varian.fileheader2dic(nmrglue.varian.get_fileheader(f))
+        dic['procpar'] = procpar
+        # each block is a 28-byte header per block header followed by its traces
+        block = numpy.dtype([
+            ('header', 'V%i'%(28*dic['nbheaders'])),
+            ('data', nmrglue.varian.find_dtype(dic), (dic['ntraces'], dic['np'])),
+            ])
+        blocks = numpy.memmap(filename, dtype=block, mode='r', offset=32, shape=(dic['nblocks'],))
+        return dic, cls(blocks['data'], nmrglue.varian.uninterleave_data)
+
+    @classmethod
+    def from_bruker(cls, fid_path):
+        """
+        Map a Bruker .fid directory, returning the parameter dictionary (as
+        returned by :func:`nmrglue.bruker.read`) and the mapped data. The
+        digital filter is removed from each FID as it is decoded.
+        """
+        # acqu2s and acqu3s give the shape of arrayed (ser) experiments
+        dic = nmrglue.bruker.read_acqus_file(fid_path)
+        for bin_file in ['fid', 'ser']:
+            filename = os.path.join(fid_path, bin_file)
+            if os.path.isfile(filename):
+                break
+        else:
+            raise OSError('No Bruker binary file could be found in %s'%fid_path)
+        dic['FILE_SIZE'] = os.stat(filename).st_size
+        shape, cplex = nmrglue.bruker.guess_shape(dic)
+        dtype = numpy.dtype('f8' if dic['acqus'].get('DTYPA') == 2 else 'i4')
+        dtype = dtype.newbyteorder('>' if dic['acqus'].get('BYTORDA') == 1 else '<')
+        rows = numpy.memmap(filename, dtype=dtype, mode='r', shape=(int(numpy.prod(shape)),))
+        rows = rows.reshape(-1, shape[-1])
+
+        def decode(row):
+            if cplex:
+                row = nmrglue.bruker.complexify_data(row)
+            return nmrglue.bruker.remove_digital_filter(dic, row)
+
+        return dic, cls(rows, decode)
+
+
+class _StageCache():
+    """
+    Content-addressed on-disk cache of processing results, bounded in size by
+    evicting the least recently used entries. Each entry is a single .npz file
+    named by the hash of the inputs that produced it.
+    """
+
+    def __init__(self, directory, max_size=2**30):
+        """
+        Keyword arguments:
+        directory -- directory in which entries are stored
+        max_size -- maximum total size of the entries in bytes
+        """
+        if not isinstance(max_size, numbers.Number) or max_size <= 0:
+            raise ValueError('max_size must be a positive number.')
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.max_size = max_size
+
+    def key(self, stage, data, params):
+        """
+        Return a hex digest identifying stage applied to the list of arrays data
+        with parameters params.
+        """
+        digest = hashlib.sha256(stage.encode())
+        self._update(digest, data)
+        self._update(digest, params)
+        return digest.hexdigest()
+
+    @classmethod
+    def _update(cls, digest, obj):
+        if isinstance(obj, numpy.ndarray):
+            obj = numpy.ascontiguousarray(obj)
+            digest.update('array{}{}'.format(obj.dtype.str, obj.shape).encode())
+            digest.update(obj.data if obj.dtype.kind != 'O' else repr(obj.tolist()).encode())
+        elif isinstance(obj, (list, tuple)):
+            digest.update('list{}'.format(len(obj)).encode())
+            for item in obj:
+                cls._update(digest, item)
+        else:
+            digest.update(repr(obj).encode())
+
+    def _path(self, key):
+        return os.path.join(self.directory, key+'.npz')
+
+    def get(self, key):
+        """
+        Return the results stored under key, as a dictionary of lists with one
+        entry (an array or None) per FID, or None if there is no such entry.
+        """
+        path = self._path(key)
+        try:
+            with numpy.load(path) as f:
+                arrays = {name: f[name] for name in f.files}
+        except (FileNotFoundError, OSError, ValueError):
+            return None
+        # mark as recently used
+        os.utime(path)
+        count = int(arrays.pop('_count'))
+        results = {str(attr): [None]*count for attr in arrays.pop('_attrs')}
+        for name, value in arrays.items():
+            attr, index = name.rsplit('.', 1)
+            results[attr][int(index)] = value
+        return results
+
+    def put(self, key, results):
+        """
+        Store results, a dictionary of lists with one entry (an array or None)
+        per FID, under key, and evict old entries if the cache is too large.
+        """
+        arrays = {
+            '_attrs': numpy.array(list(results), dtype=str),
+            '_count': numpy.array(max([len(values) for values in results.values()]+[0])),
+            }
+        for attr, values in results.items():
+            for index, value in enumerate(values):
+                if value is not None:
+                    arrays['{}.{}'.format(attr, index)] = numpy.asarray(value)
+        path = self._path(key)
+        # write to a temporary file so that readers never see a partial entry
+        tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+        with open(tmp_path, 'wb') as f:
+            numpy.savez(f, **arrays)
+        os.replace(tmp_path, path)
+        self._evict()
+
+    def _evict(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith('.npz'):
+                try:
+                    stat = os.stat(os.path.join(self.directory, name))
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, name))
+        total = sum(entry[1] for entry in entries)
+        for mtime, size, name in sorted(entries):
+            if total <= self.max_size:
+                break
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                pass
+            total -= size
+
 class Importer(Base):
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.data = None
+        self.lazy = kwargs.get('lazy', False)
+        self._mapped_data = None
 
     @property
     def data(self):
@@ -1858,57 +4280,102 @@ class Importer(Base):
 
     def import_fid(self):
         """
-        This will first attempt to import Bruker data. Failing that, Varian.
+        Import Bruker or Varian data, as identified by :meth:`~nmrpy.data_objects.Importer._detect_format`.
         """
+        file_format = self._detect_format(self.fid_path)
+        if file_format == 'bruker':
+            self._import_bruker()
+        elif file_format == 'varian':
+            self._import_varian()
+        else:
+            print('fid_path does not specify a valid .fid directory.')
+
+    @staticmethod
+    def _detect_format(fid_path):
+        """
+        Identify the format of fid_path from its directory contents or file header
+        alone, without reading any data. Returns 'bruker', 'varian', 'nmrpy' (a
+        saved project or pickled :class:`~nmrpy.data_objects.FidArray`), or None
+        if the format is not recognised.
+
+        Keyword arguments:
+        fid_path -- path to a .fid directory or NMRPy file
+        """
+        if not isinstance(fid_path, str):
+            return None
+        if os.path.isdir(fid_path):
+            if FidArray._is_project(fid_path):
+                return 'nmrpy'
+            if os.path.isfile(os.path.join(fid_path, 'acqus')):
+                return 'bruker'
+            if os.path.isfile(os.path.join(fid_path, 'procpar')):
+                return 'varian'
+        elif os.path.isfile(fid_path):
+            with open(fid_path, 'rb') as f:
+                # pickle protocols 2 and above start with the PROTO opcode
+                if f.read(1) == pickle.PROTO:
+                    return 'nmrpy'
+        return None
+
+    def _import_bruker(self):
+        """
+        Read (or, if lazy, memory-map) Bruker data from fid_path.
+        """
+        if self.lazy:
+            self._map_fid('bruker')
+            return
         try:
-            print('Attempting Bruker')
             procpar, data = nmrglue.bruker.read(self.fid_path)
             self.data = data
             self._procpar = procpar['acqus']
             self._file_format = 'bruker'
             self.data = nmrglue.bruker.remove_digital_filter(procpar, self.data)
-            return
         except (FileNotFoundError, OSError):
             print('fid_path does not specify a valid .fid directory.')
-            return 
-        except TypeError:
-            print('probably not Bruker data')
-        try: 
-            print('Attempting Varian')
-            procpar, data = nmrglue.varian.read(self.fid_path)
-            self._procpar = procpar
-            self.data = data 
-            self._file_format = 'varian'
-            return
-        except TypeError:
-            print('probably not Varian data')
-
-class VarianImporter(Importer):
 
-    def import_fid(self):
+    def _import_varian(self):
+        """
+        Read (or, if lazy, memory-map) Varian data from fid_path.
+        """
+        if self.lazy:
+            self._map_fid('varian')
+            return
         try:
             procpar, data = nmrglue.varian.read(self.fid_path)
             self.data = data 
             self._procpar = procpar
             self._file_format = 'varian'
-        except FileNotFoundError:
+        except (FileNotFoundError, OSError):
             print('fid_path does not specify a valid .fid directory.')
-        except OSError:
+
+    def _map_fid(self, file_format):
+        """
+        Memory-map the binary file without reading it, storing the mapped FIDs
+        in _mapped_data.
+
+        Keyword arguments:
+        file_format -- 'varian' or 'bruker'
+        """
+        try:
+            if file_format == 'bruker':
+                procpar, self._mapped_data = _MappedFidData.from_bruker(self.fid_path)
+                self._procpar = procpar['acqus']
+            else:
+                procpar, self._mapped_data = _MappedFidData.from_varian(self.fid_path)
+                self._procpar = procpar
+            self._file_format = file_format
+        except (FileNotFoundError, OSError):
             print('fid_path does not specify a valid .fid directory.')
+
+class VarianImporter(Importer):
+
+    def import_fid(self):
+        self._import_varian()
         
 class BrukerImporter(Importer):
 
     def import_fid(self):
-        try:
-            procpar, data = nmrglue.bruker.read(self.fid_path)
-            self.data = data
-            self._procpar = procpar['acqus']
-            self._file_format = 'bruker'
-            self.data = nmrglue.bruker.remove_digital_filter(procpar, self.data)
-        except FileNotFoundError:
-            print('fid_path does not specify a valid .fid directory.')
-        except OSError:
-            print('fid_path does not specify a valid .fid directory.')
+        self._import_bruker()
 
 if __name__ == '__main__':
     pass
@@ -89,6 +89,7 @@ class Plot():
     def _deconv_generator(self, fid,
             upper_ppm=None, 
             lower_ppm=None, 
+            cutoff=None,
             ):
 
         data = fid.data
@@ -97,7 +98,7 @@ class Plot():
         if not Plot._is_flat_iter(data): 
             raise AttributeError('data must be flat iterable.')
 
-        peakshapes = fid._f_pks_list(fid._deconvoluted_peaks, numpy.arange(len(data))) 
+        peakshapes = fid._f_pks_list(fid._deconvoluted_peaks, numpy.arange(len(data)), cutoff=cutoff) 
 
         if not Plot._is_iter_of_iters(peakshapes): 
             raise AttributeError('data must be flat iterable.')
@@ -128,12 +129,14 @@ class Plot():
             peak_colour='b', 
             summed_peak_colour='r', 
             residual_colour='g', 
-            lw=1):
+            lw=1,
+            cutoff=None):
 
         #validation takes place in self._deconv_generator
         ppm, data, peakshapes, summed_peaks, residual, upper_ppm, lower_ppm = self._deconv_generator(fid,
                                                                                 upper_ppm=upper_ppm,
-                                                                                lower_ppm=lower_ppm)
+                                                                                lower_ppm=lower_ppm,
+                                                                                cutoff=cutoff)
 
         self.fig = plt.figure(figsize=[9,5])
         ax = self.fig.add_subplot(111)
@@ -166,7 +169,8 @@ class Plot():
             lw=0.3, 
             azim=-90, 
             elev=20, 
-            filename=None):
+            filename=None,
+            cutoff=None):
 
         if lower_index is None:
             lower_index = 0
@@ -177,7 +181,7 @@ class Plot():
         fids = fids[lower_index: upper_index]
         generated_deconvs = []
         for fid in fids:
-            generated_deconvs.append(self._deconv_generator(fid, upper_ppm=upper_ppm, lower_ppm=lower_ppm))
+            generated_deconvs.append(self._deconv_generator(fid, upper_ppm=upper_ppm, lower_ppm=lower_ppm, cutoff=cutoff))
       
         params = fids[0]._params 
         ppm = generated_deconvs[0][0]
@@ -977,7 +981,7 @@ class DataSelector():
                 ):
         if not Plot._is_iter(data):
             raise AttributeError('data must be iterable.')
-        self.data = numpy.array(data)
+        self.data = numpy.asarray(data)
         self.extra_data = extra_data
         self.extra_data_colour = extra_data_colour
         self.params = params
@@ -1,8 +1,13 @@
 import unittest
 from nmrpy.data_objects import *
+from nmrpy.data_objects import _VectorCache
 from nmrpy import __version__
 import numpy
 import os
+import pickle
+import shutil
+import tempfile
+from unittest import mock
 
 testpath = os.path.dirname(__file__)
 
@@ -114,6 +119,25 @@ class TestFidInitialisation(unittest.TestCase):
             with self.assertRaises(TypeError):
                Fid.from_data(test_data)
 
+    def test_array_validation(self):
+        fid = Fid()
+        for data in [numpy.arange(5), numpy.arange(5.0), numpy.arange(5, dtype='complex'), numpy.array([])]:
+            fid.data = data
+            self.assertTrue(numpy.array_equal(fid.data, data))
+        for data in [numpy.ones((2, 2)), numpy.array(['a', 'b']), numpy.array([1, 'a'], dtype=object), numpy.array(1.0)]:
+            with self.assertRaises(TypeError):
+                fid.data = data
+        fid.peaks = numpy.array([4.71, 4.64])
+        fid.ranges = numpy.array([[5.29, 3.67]])
+        with self.assertRaises(AttributeError):
+            fid.peaks = numpy.ones((2, 2))
+        with self.assertRaises(AttributeError):
+            fid.ranges = numpy.array([[5.29, 'a']], dtype=object)
+        self.assertTrue(Fid._is_iter_of_iters(numpy.ones((2, 2))))
+        self.assertFalse(Fid._is_iter_of_iters(numpy.ones(2)))
+        self.assertTrue(Fid._is_flat_iter(numpy.ones(2)))
+        self.assertFalse(Fid._is_flat_iter(numpy.ones((2, 2))))
+
     def test_real(self):
         fid = Fid.from_data(numpy.arange(10, dtype='complex'))
         fid.real()
@@ -178,6 +202,64 @@ class TestFidInitialisation(unittest.TestCase):
         fid._f_pks([p1, p2], x)
         fid._f_pks([p1, p2], list(x))
 
+    def test_f_pks_array(self):
+        x = numpy.arange(100)
+        params = [
+            [10.0, 2.0, 1.5, 3.0, 0.0],
+            [20.0, 1.0, 1.0, 1.0, 0.5],
+            [50.5, 4.0, 2.0, 2.0, 1.0],
+            [70.0, 1.0, 3.0, 1.0, 2.0],
+            ]
+        expected = []
+        for offset, sigma, hwhm, amplitude, frac_gauss in params:
+            frac_gauss = min(frac_gauss, 1.0)
+            expected.append(frac_gauss*Fid._f_gauss(offset, amplitude, sigma, x) + \
+                    (1-frac_gauss)*Fid._f_lorentz(offset, amplitude, hwhm, x))
+        expected = numpy.array(expected)
+        self.assertTrue(numpy.allclose(Fid._f_pks_array(params, x), expected))
+        self.assertTrue(numpy.allclose(Fid._f_pks_list(params, x), expected))
+        self.assertTrue(numpy.allclose(Fid._f_pks(params, x), expected.sum(0)))
+        self.assertTrue(numpy.allclose(Fid._f_pk(x, *params[1]), expected[1]))
+        out = numpy.empty((len(params), len(x)))
+        self.assertIs(Fid._f_pks_array(params, x, out=out), out)
+
+    def test_f_pks_jacobian(self):
+        x = numpy.arange(100, dtype='f8')
+        params = numpy.array([
+            [30.0, 3.0, 2.0, 2.0, 0.3],
+            [60.5, 2.0, 4.0, 1.0, 0.8],
+            ])
+        jac = Fid._f_pks_jacobian(params, x)
+        h = 1e-6
+        for i in range(len(params)):
+            for j in range(5):
+                dp = params.copy()
+                dp[i, j] += h
+                fd = (Fid._f_pks_array(dp, x)[i]-Fid._f_pks_array(params, x)[i])/h
+                self.assertTrue(numpy.allclose(jac[i, j], fd, atol=1e-4))
+
+    def test_f_fitp_jacobian(self):
+        x = numpy.arange(200, dtype='f8')
+        true_params = [[80.0, 4.0, 3.0, 10.0, 0.0], [110.0, 4.0, 5.0, 6.0, 0.0]]
+        data = Fid._f_pks(true_params, x)
+        for method in ['leastsq', 'least_squares']:
+            fits = numpy.array(Fid._f_fitp(data, numpy.array([78, 112]), frac_gauss=0.0, method=method))
+            self.assertTrue(numpy.allclose(fits[:, [0, 2, 3]], numpy.array(true_params)[:, [0, 2, 3]], rtol=1e-3))
+
+    def test_f_pks_cutoff(self):
+        x = numpy.arange(1000, dtype='f8')
+        params = [[200.0, 2.0, 1.0, 1.0, 0.5], [600.0, 3.0, 2.0, 2.0, 0.0]]
+        full = Fid._f_pks_list(params, x)
+        windowed = Fid._f_pks_list(params, x, cutoff=50)
+        self.assertTrue(numpy.allclose(windowed, full, atol=1e-3))
+        self.assertEqual(windowed[0, 400], 0.0)
+        self.assertEqual(windowed[1, 550], full[1, 550])
+        self.assertTrue(numpy.allclose(Fid._f_pks_sum(params, x, cutoff=50), windowed.sum(0)))
+        jac = Fid._f_pks_jacobian(params, x)
+        windowed_jac = Fid._f_pks_jacobian(params, x, cutoff=50)
+        self.assertTrue(numpy.array_equal(windowed_jac[1, :, 550], jac[1, :, 550]))
+        self.assertTrue(numpy.all(windowed_jac[0, :, 400] == 0.0))
+
     def test_f_pks_failed(self):
         fid = Fid()
         x = numpy.arange(100)
@@ -354,6 +436,150 @@ class TestFidArrayInitialisation(unittest.TestCase):
         self.assertIsInstance(fid_array._procpar, dict)
         self.assertIsInstance(fid_array._params, dict)
 
+    def test_from_path_lazy(self):
+        for path, file_format in [(os.path.join(testpath, 'test_data', 'test1.fid'), 'varian'),
+                                  (os.path.join(testpath, 'test_data', 'bruker1'), 'bruker')]:
+            eager = FidArray.from_path(fid_path=path, file_format=file_format)
+            fid_array = FidArray.from_path(fid_path=path, file_format=file_format, lazy=True)
+            fids = fid_array.get_fids()
+            self.assertEqual(len(fids), len(eager.get_fids()))
+            self.assertTrue(all(fid._data_loader is not None for fid in fids))
+            self.assertTrue(numpy.array_equal(fids[-1].data, eager.get_fids()[-1].data))
+            self.assertIsNone(fids[-1]._data_loader)
+            self.assertTrue(all(fid._data_loader is not None for fid in fids[:-1]))
+            self.assertTrue(numpy.array_equal(fid_array.data, eager.data))
+            self.assertEqual(fid_array._file_format, file_format)
+            self.assertEqual(fids[0]._params.keys(), eager.get_fids()[0]._params.keys())
+
+    @staticmethod
+    def _bruker_ser(directory, n_fids=5):
+        # an arrayed Bruker experiment built from bruker1: a ser file of scaled
+        # copies of its FID, and an acqu2s giving the number of FIDs
+        path = os.path.join(directory, 'ser1')
+        shutil.copytree(os.path.join(testpath, 'test_data', 'bruker1'), path)
+        raw = numpy.fromfile(os.path.join(path, 'fid'), dtype='>i4')
+        numpy.concatenate([raw//(i+1) for i in range(n_fids)]).tofile(os.path.join(path, 'ser'))
+        os.remove(os.path.join(path, 'fid'))
+        with open(os.path.join(path, 'acqus')) as f:
+            acqus = f.read()
+        with open(os.path.join(path, 'acqu2s'), 'w') as f:
+            f.write(acqus.replace('##$TD= 32768', '##$TD= {}'.format(n_fids)))
+        return path
+
+    def test_from_path_lazy_bruker_ser(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = self._bruker_ser(tmpdir)
+            eager = FidArray.from_path(fid_path=path)
+            self.assertEqual(eager.data.shape[0], 5)
+            fid_array = FidArray.from_path(fid_path=path, lazy=True)
+            self.assertEqual(len(fid_array.get_fids()), 5)
+            self.assertTrue(numpy.array_equal(fid_array.data, eager.data))
+
+    def test_from_path_indices(self):
+        path = os.path.join(testpath, 'test_data', 'test1.fid')
+        eager = FidArray.from_path(fid_path=path)
+        for indices in [slice(None, None, 10), slice(2, 5), [0, 23], -1]:
+            fid_array = FidArray.from_path(fid_path=path, indices=indices)
+            fids = fid_array.get_fids()
+            self.assertTrue(all(fid._data_loader is None for fid in fids))
+            self.assertTrue(numpy.array_equal(fid_array.data, numpy.atleast_2d(eager.data[indices])))
+            self.assertIsInstance(fids[0]._params, dict)
+        fid_array = FidArray.from_path(fid_path=path, indices=slice(1, 3), lazy=True)
+        self.assertTrue(all(fid._data_loader is not None for fid in fid_array.get_fids()))
+        self.assertTrue(numpy.array_equal(fid_array.data, eager.data[1:3]))
+        with self.assertRaises(IndexError):
+            FidArray.from_path(fid_path=path, indices=[24])
+
+    def test_from_path_indices_bruker_ser(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = self._bruker_ser(tmpdir)
+            eager = FidArray.from_path(fid_path=path)
+            for indices, source_indices in [([1, 3], [1, 3]), (slice(None, None, 2), [0, 2, 4]), (slice(1, 4), [1, 2, 3])]:
+                fid_array = FidArray.from_path(fid_path=path, indices=indices)
+                self.assertTrue(numpy.array_equal(fid_array.data, eager.data[source_indices]))
+                self.assertTrue(numpy.array_equal(fid_array.source_indices, source_indices))
+                self.assertEqual([fid.id for fid in fid_array.get_fids()], ['fid%i'%i for i in source_indices])
+            with self.assertRaises(IndexError):
+                FidArray.from_path(fid_path=path, indices=[5])
+
+    def test_from_path_indices_time(self):
+        path = os.path.join(testpath, 'test_data', 'test1.fid')
+        eager = FidArray.from_path(fid_path=path)
+        acqtime = eager._params['acqtime'][0]
+        self.assertTrue(numpy.allclose(eager.t, (1+numpy.arange(24))*acqtime))
+        for indices, source_indices in [(slice(None, None, 10), [0, 10, 20]), (slice(5, 8), [5, 6, 7]), ([-1], [23])]:
+            fid_array = FidArray.from_path(fid_path=path, indices=indices)
+            self.assertTrue(numpy.array_equal(fid_array.source_indices, source_indices))
+            self.assertTrue(numpy.allclose(fid_array.t, eager.t[source_indices]))
+            self.assertEqual([fid.id for fid in fid_array.get_fids()], ['fid%02i'%i for i in source_indices])
+        # subsets of saved projects keep their positions in the experiment
+        with tempfile.TemporaryDirectory() as tmpdir:
+            filename = os.path.join(tmpdir, 'project.nmrpy')
+            FidArray.from_path(fid_path=path, indices=slice(5, 8)).save_to_file(filename)
+            fid_array = FidArray.from_path(fid_path=filename, indices=[1])
+            self.assertTrue(numpy.allclose(fid_array.t, eager.t[[6]]))
+            self.assertEqual(fid_array.get_fids()[0].id, 'fid06')
+
+    def test_detect_format(self):
+        test_data = os.path.join(testpath, 'test_data')
+        self.assertEqual(Importer._detect_format(os.path.join(test_data, 'test1.fid')), 'varian')
+        self.assertEqual(Importer._detect_format(os.path.join(test_data, 'bruker1')), 'bruker')
+        self.assertEqual(Importer._detect_format(os.path.join(test_data, 'test1.nmrpy')), 'nmrpy')
+        self.assertIsNone(Importer._detect_format(test_data))
+        self.assertIsNone(Importer._detect_format(os.path.join(test_data, 'test1.fid', 'procpar')))
+        self.assertIsNone(Importer._detect_format('non_existent_path'))
+        self.assertIsNone(Importer._detect_format(None))
+        with self.assertRaises(OSError):
+            FidArray.from_path(test_data)
+
+    def test_shared_params(self):
+        path = os.path.join(testpath, 'test_data', 'test1.fid')
+        fid_array = FidArray.from_path(fid_path=path)
+        params = fid_array._params
+        self.assertIsInstance(params, AcquisitionParameters)
+        self.assertTrue(all(fid._params is params for fid in fid_array.get_fids()))
+        self.assertTrue(all(fid._procpar is fid_array._procpar for fid in fid_array.get_fids()))
+        self.assertEqual(params.sw_hz, params['sw_hz'])
+        with self.assertRaises(TypeError):
+            params['sw'] = 1.0
+        with self.assertRaises(TypeError):
+            params.update(sw=1.0)
+        with self.assertRaises(ValueError):
+            params['acqtime'][0] = 1.0
+        with self.assertRaises(AttributeError):
+            params.not_a_parameter
+        loaded = pickle.loads(pickle.dumps(fid_array))
+        self.assertTrue(all(fid._params is loaded._params for fid in loaded.get_fids()))
+        self.assertEqual(loaded._params.keys(), params.keys())
+
+    def test_from_paths(self):
+        path_varian = os.path.join(testpath, 'test_data', 'test1.fid')
+        path_bruker = os.path.join(testpath, 'test_data', 'bruker1')
+        varian = FidArray.from_path(fid_path=path_varian)
+        bruker = FidArray.from_path(fid_path=path_bruker)
+        fid_array = FidArray.from_paths([path_varian, path_bruker], threads=2)
+        fids = fid_array.get_fids()
+        self.assertEqual(len(fids), 25)
+        # the Bruker data were acquired first
+        self.assertEqual(fids[0]._file_format, 'bruker')
+        self.assertTrue(numpy.array_equal(fids[0].data, bruker.get_fids()[0].data))
+        self.assertTrue(numpy.array_equal([fid.data for fid in fids[1:]], varian.data))
+        self.assertTrue(all(fid.fid_path == path_varian for fid in fids[1:]))
+        self.assertIsInstance(fids[1]._params, dict)
+        fid_array = FidArray.from_paths([path_varian, path_bruker], sort=False)
+        self.assertEqual(fid_array.get_fids()[0]._file_format, 'varian')
+        fid_array = FidArray.from_paths(os.path.join(testpath, 'test_data', 'test1.f*'))
+        self.assertTrue(numpy.array_equal(fid_array.data, varian.data))
+        with self.assertRaises(ValueError):
+            FidArray.from_paths(os.path.join(testpath, 'test_data', 'missing*'))
+
+    def test_from_path_lazy_pickle(self):
+        path = os.path.join(testpath, 'test_data', 'test1.fid')
+        fid_array = FidArray.from_path(fid_path=path, lazy=True)
+        fid_array = pickle.loads(pickle.dumps(fid_array))
+        self.assertTrue(numpy.array_equal(fid_array.data,
+            FidArray.from_path(fid_path=path).data))
+
     def test_failed_from_path_array_varian(self):
         path = os.path.join(testpath, 'test_data', 'bruker1')
         with self.assertRaises(AttributeError):
@@ -381,6 +607,27 @@ class TestFidArrayInitialisation(unittest.TestCase):
         fid_array = FidArray.from_path(path)
         self.assertIsInstance(fid_array.data, numpy.ndarray)
 
+    def test_data_block_views(self):
+        path = os.path.join(testpath, 'test_data', 'test1.fid')
+        fid_array = FidArray.from_path(path)
+        data = fid_array.data
+        self.assertTrue(data.flags['C_CONTIGUOUS'])
+        self.assertIs(data, fid_array.data)
+        for fid, row in zip(fid_array.get_fids(), data):
+            self.assertTrue(numpy.shares_memory(fid.data, data))
+            self.assertTrue(numpy.array_equal(fid.data, row))
+
+    def test_data_block_rebuilt_after_assignment(self):
+        fid_array = FidArray.from_data(3*[numpy.arange(4, dtype='complex')])
+        fid = fid_array.get_fids()[1]
+        fid.data = numpy.ones(4, dtype='complex')
+        data = fid_array.data
+        self.assertTrue(numpy.array_equal(data[1], numpy.ones(4)))
+        self.assertTrue(numpy.shares_memory(fid.data, data))
+        fid_array.real_fids()
+        self.assertFalse(fid_array.data.dtype in fid_array._complex_dtypes)
+        self.assertFalse(fid.data.dtype in fid._complex_dtypes)
+
     def test_failed_from_path_array(self):
         path = None
         with self.assertRaises(AttributeError):
@@ -453,6 +700,111 @@ class TestFidUtils(unittest.TestCase):
         fid = self.fid_array_bruker.get_fids()[0]
         fid.ps(p0=20, p1=20)
 
+    def test_window_cache(self):
+        fids = self.fid_array_varian.get_fids()
+        size = len(fids[0].data)
+        window = Fid._emhz_window(size, 5.0, fids[0]._params['sw_hz'], fids[0].data.dtype)
+        self.assertFalse(window.flags.writeable)
+        self.assertIs(Fid._emhz_window(size, 5, fids[1]._params['sw_hz'], numpy.complex128), window)
+        self.assertIsNot(Fid._emhz_window(size, 5.0, fids[0]._params['sw_hz'], numpy.complex64), window)
+        # only the parameter-independent part of the phase ramp is cached
+        Fid._vector_cache.clear()
+        data = fids[0].data.copy()
+        expected = numpy.exp(1.0j*(0.2+0.3*numpy.arange(size)/size))*data
+        self.assertTrue(numpy.allclose(Fid._ps(data, p0=0.2*180.0/numpy.pi, p1=0.3*180.0/numpy.pi), expected))
+        Fid._ps(data, p0=10.0, p1=30.0)
+        self.assertEqual(len(Fid._vector_cache), 1)
+        fids[0].ps(p0=0.2*180.0/numpy.pi, p1=0.3*180.0/numpy.pi)
+        self.assertTrue(numpy.allclose(fids[0].data, expected))
+        Fid._vector_cache.clear()
+        self.fid_array_varian.emhz_fids()
+        self.assertEqual(len(Fid._vector_cache), 1)
+        # the cache is bounded by the size of its arrays
+        cache = _VectorCache(3*8*size)
+        for i in range(5):
+            cache.get(i, lambda: numpy.zeros(size))
+        self.assertEqual(len(cache), 3)
+        self.assertEqual(cache.nbytes, 3*8*size)
+        self.assertEqual(list(cache._entries), [2, 3, 4])
+        cache.get(2, None)
+        cache.get(5, lambda: numpy.zeros(size))
+        self.assertEqual(list(cache._entries), [4, 2, 5])
+        self.assertFalse(cache.get(6, lambda: numpy.zeros(4*size)).flags.writeable)
+        self.assertNotIn(6, cache._entries)
+
+    def test_apodise(self):
+        fid = self.fid_array_varian.get_fids()[0]
+        size = len(fid.data)
+        sw_hz = fid._params['sw_hz']
+        t = numpy.arange(size)/sw_hz
+        x = numpy.arange(size)/(size-1)
+        windows = [
+            ('exponential', {'lb': 3.0}, numpy.exp(-numpy.pi*3.0*t)),
+            ('gaussian', {'lb': 2.0, 'gb': 4.0}, numpy.exp(numpy.pi*2.0*t-(numpy.pi*4.0*t)**2/(4*numpy.log(2)))),
+            ('sine', {}, numpy.sin(numpy.pi*x)),
+            ('sine', {'off': 0.5, 'power': 2}, numpy.sin(numpy.pi*(0.5+0.5*x))**2),
+            ('trapezoid', {'rise': 10, 'fall': 20}, numpy.concatenate([
+                numpy.arange(1, 11)/10, numpy.ones(size-30), numpy.arange(20, 0, -1)/20])),
+            ]
+        for window, kwargs, expected in windows:
+            self.assertTrue(numpy.allclose(Fid._apodisation_window(window, size, sw_hz, numpy.complex128, **kwargs), expected))
+        data = fid.data.copy()
+        fid.apodise('sine', off=0.5, power=2)
+        self.assertTrue(numpy.allclose(fid.data, data*windows[3][2]))
+        # the whole array is multiplied by one window
+        block = self.fid_array_varian.data.copy()
+        self.fid_array_varian.apodise_fids('gaussian', lb=2.0, gb=4.0)
+        self.assertTrue(numpy.allclose(self.fid_array_varian.data, block*windows[1][2]))
+        with self.assertRaises(ValueError):
+            fid.apodise('not_a_window')
+        with self.assertRaises(TypeError):
+            self.fid_array_varian.apodise_fids('sine', lb=1.0)
+        with self.assertRaises(ValueError):
+            fid.apodise('trapezoid', rise=size, fall=1)
+
+    def test_single_precision(self):
+        fid = self.fid_array_varian.get_fids()[0]
+        reference = Fid.from_data(fid.data)
+        reference._params = fid._params
+        fid.precision = 'single'
+        self.assertEqual(fid.data.dtype, numpy.csingle)
+        fid.emhz()
+        fid.ft()
+        fid.ps(p0=20, p1=20)
+        self.assertEqual(fid.data.dtype, numpy.csingle)
+        fid.real()
+        self.assertEqual(fid.data.dtype, numpy.single)
+        fid._bl_ppm = [8.0, 7.5, 2.0, 1.5]
+        fid.baseline_correct()
+        self.assertEqual(fid.data.dtype, numpy.single)
+        reference._file_format = fid._file_format
+        reference._flags['ft'] = False
+        reference.emhz()
+        reference.ft()
+        reference.ps(p0=20, p1=20)
+        reference.real()
+        reference._bl_ppm = [8.0, 7.5, 2.0, 1.5]
+        reference.baseline_correct()
+        self.assertEqual(reference.data.dtype, numpy.double)
+        self.assertTrue(numpy.allclose(fid.data, reference.data, atol=1e-5*abs(reference.data).max()))
+        fid.precision = 'double'
+        self.assertEqual(fid.data.dtype, numpy.double)
+        with self.assertRaises(ValueError):
+            fid.precision = 'half'
+
+    def test_fid_array_single_precision(self):
+        fid_array = self.fid_array_varian
+        fid_array.precision = 'single'
+        self.assertEqual(fid_array.precision, 'single')
+        self.assertEqual(fid_array.data.dtype, numpy.csingle)
+        self.assertTrue(all(fid.data.dtype == numpy.csingle for fid in fid_array.get_fids()))
+        fid_array.ft_fids()
+        fid_array.phase_correct_fids(mp=False)
+        fid_array.real_fids()
+        self.assertEqual(fid_array.data.dtype, numpy.single)
+        fid_array.get_fids()[0].precision = 'double'
+        self.assertIsNone(fid_array.precision)
+
     def test_ps_failed(self):
         for fid in [self.fid_array_varian.get_fids()[0], self.fid_array_bruker.get_fids()[0]]:
             with self.assertRaises(TypeError):
@@ -555,6 +907,16 @@ class TestFidUtils(unittest.TestCase):
         fid.real()
         fid.deconv()
 
+    def test_deconv_cutoff(self):
+        fid = self.fid_array_varian.get_fids()[0]
+        fid.ft() 
+        fid.phase_correct() 
+        fid.real()
+        fid.deconv(cutoff=50)
+        self.assertEqual(len(fid._deconvoluted_peaks), len(fid.peaks))
+        with self.assertRaises(ValueError):
+            fid.deconv(cutoff=-1)
+
 class TestFidArrayUtils(unittest.TestCase):
 
     def setUp(self):
@@ -577,17 +939,412 @@ class TestFidArrayUtils(unittest.TestCase):
     def test_ft_fids(self):
         self.fid_array_varian.ft_fids(mp=False)
 
+    def test_ft_fids_batch(self):
+        for fid_array in [self.fid_array_varian, self.fid_array_bruker]:
+            fids = fid_array.get_fids()
+            ft_data = numpy.array([Fid._ft([fid.data, fid._file_format]) for fid in fids])
+            block = fid_array.data
+            fid_array.ft_fids(batch=True)
+            self.assertIs(fid_array.data, block)
+            self.assertTrue(numpy.allclose(ft_data, fid_array.data))
+            self.assertTrue(all(fid._flags['ft'] for fid in fids))
+        with self.assertRaises(ValueError):
+            self.fid_array_varian.ft_fids(batch=True)
+
+    def test_ft_fids_shared_memory(self):
+        ft_data = numpy.array([Fid._ft([fid.data, fid._file_format]) for fid in self.fid_array_varian.get_fids()])
+        self.fid_array_varian.ft_fids(mp=True, batch=False)
+        self.assertTrue(numpy.allclose(ft_data, self.fid_array_varian.data))
+        for fid in self.fid_array_varian.get_fids():
+            self.assertTrue(numpy.shares_memory(fid.data, self.fid_array_varian.data))
+
+    def test_ft_array_odd_length(self):
+        data = numpy.random.randn(3, 7)+1j*numpy.random.randn(3, 7)
+        for file_format in ['varian', 'bruker']:
+            ft_data = numpy.array([Fid._ft([datum, file_format]) for datum in data])
+            self.assertTrue(numpy.allclose(ft_data, Fid._ft_array(data, file_format)))
+            # in place, one row at a time
+            out = data.copy()
+            self.assertIs(Fid._ft_array(out, file_format, out=out, chunk_size=1), out)
+            self.assertTrue(numpy.allclose(ft_data, out))
+
     def test_phase_correct_fids_mp(self):
         self.fid_array_varian.ft_fids()
         self.fid_array_varian.phase_correct_fids()
 
+    def test_persistent_pool(self):
+        with self.fid_array_varian as fid_array:
+            fid_array.ft_fids(batch=False)
+            pool = fid_array._pool
+            self.assertIsNotNone(pool)
+            fid_array.phase_correct_fids()
+            self.assertIs(pool, fid_array._pool)
+        self.assertIsNone(fid_array._pool)
+        # the cgroup quota files are closed after reading
+        opened = []
+        def tracking_open(*args, **kwargs):
+            f = builtin_open(*args, **kwargs)
+            opened.append(f)
+            return f
+        builtin_open = open
+        with mock.patch('builtins.open', tracking_open):
+            self.assertTrue(FidArray._available_cpus() >= 1)
+        self.assertTrue(all(f.closed for f in opened))
+        with self.assertRaises(ValueError):
+            fid_array.start_pool(cpus=0)
+
+    def test_save_to_file(self):
+        fid_array = self.fid_array_varian
+        fid_array.ft_fids()
+        fid_array.get_fids()[1].peaks = None
+        fid_array.get_fids()[2]._bl_ppm = [5.0, 4.0]
+        fid_array.get_fids()[2]._bl_poly = numpy.zeros(len(fid_array.data[0]))
+        with tempfile.TemporaryDirectory() as tmpdir:
+            filename = os.path.join(tmpdir, 'project.nmrpy')
+            for compress in [False, True]:
+                fid_array.save_to_file(filename, chunk_size=5, compress=compress)
+                # per-FID arrays are kept out of the index, which is read on every load
+                index = FidArray._read_project_index(filename)
+                self.assertFalse(any(isinstance(value, numpy.ndarray)
+                                     for state in index['fids'] for value in state.values()))
+                loaded = FidArray.from_path(filename)
+                self.assertTrue(numpy.array_equal(loaded.data, fid_array.data))
+                self.assertIs(loaded.data, loaded._data_block)
+                for fid, loaded_fid in zip(fid_array.get_fids(), loaded.get_fids()):
+                    self.assertEqual(fid.id, loaded_fid.id)
+                    self.assertEqual(fid._flags, loaded_fid._flags)
+                    self.assertEqual(fid._params.keys(), loaded_fid._params.keys())
+                    if fid.peaks is None:
+                        self.assertIsNone(loaded_fid.peaks)
+                    else:
+                        self.assertTrue(numpy.array_equal(fid.peaks, loaded_fid.peaks))
+                    self.assertTrue(numpy.array_equal(fid.ranges, loaded_fid.ranges))
+                    self.assertTrue(numpy.array_equal(getattr(fid, '_bl_ppm', None), getattr(loaded_fid, '_bl_ppm', None)))
+
+            subset = FidArray.from_path(filename, indices=[3, 17])
+            self.assertEqual([fid.id for fid in subset.get_fids()], ['fid03', 'fid17'])
+            self.assertTrue(numpy.array_equal(subset.data, fid_array.data[[3, 17]]))
+
+            fid = fid_array.get_fids()[0]
+            window = (fid._ppm <= 5.0) & (fid._ppm >= 4.0)
+            data = FidArray.read_project_data(filename, indices=slice(0, 4), ppm=[5.0, 4.0])
+            self.assertTrue(numpy.array_equal(data, fid_array.data[:4, window]))
+
+            with self.assertRaises(OSError):
+                fid_array.save_to_file(tmpdir)
+
+    def test_save_to_file_incremental(self):
+        fid_array = self.fid_array_varian
+        with tempfile.TemporaryDirectory() as tmpdir:
+            filename = os.path.join(tmpdir, 'project.nmrpy')
+            fid_array.save_to_file(filename, chunk_size=5)
+            fids = fid_array.get_fids()
+            self.assertFalse(any(fid._dirty for fid in fids))
+            paths = [os.path.join(filename, 'data', f) for f in sorted(os.listdir(os.path.join(filename, 'data')))]
+            columns = ['peaks', 'ranges', 'deconvoluted_peaks', 'bl_ppm', 'bl_poly']
+            paths += [os.path.join(filename, column+'.npy') for column in columns]
+            for path in paths:
+                os.utime(path, (0, 0))
+            fids[7].data = fids[7].data*2
+            fids[12].peaks = [4.71]
+            self.assertEqual(fids[7]._dirty, {'data'})
+            fid_array.save_to_file(filename, chunk_size=5, incremental=True)
+            rewritten = [os.stat(path).st_mtime > 0 for path in paths]
+            self.assertEqual(rewritten, [False, True, False, False, False, True, False, False, False, False])
+
+            for path in paths:
+                os.utime(path, (0, 0))
+            fids[3]._bl_ppm = [5.0, 4.0]
+            self.assertEqual(fids[3]._dirty, {'bl_ppm'})
+            fid_array.save_to_file(filename, chunk_size=5, incremental=True)
+            rewritten = [os.stat(path).st_mtime > 0 for path in paths]
+            self.assertEqual(rewritten, [False]*8+[True, False])
+            self.assertTrue(numpy.array_equal(FidArray.from_path(filename).get_fids()[3]._bl_ppm, [5.0, 4.0]))
+
+            loaded = FidArray.from_path(filename)
+            self.assertTrue(numpy.array_equal(loaded.data, fid_array.data))
+            self.assertTrue(numpy.array_equal(loaded.get_fids()[12].peaks, [4.71]))
+            loaded.get_fids()[0].ranges = [[5.0, 4.0]]
+            loaded.save_to_file(filename, chunk_size=5, incremental=True)
+            self.assertTrue(numpy.array_equal(FidArray.from_path(filename).get_fids()[0].ranges, [[5.0, 4.0]]))
+
+    def test_save_to_file_failed_write(self):
+        fid_array = self.fid_array_varian
+        with tempfile.TemporaryDirectory() as tmpdir:
+            filename = os.path.join(tmpdir, 'project.nmrpy')
+            fid_array.save_to_file(filename, chunk_size=5)
+            saved = fid_array.data.copy()
+            fid_array.ft_fids()
+            with mock.patch('numpy.save', side_effect=OSError('disk full')):
+                with self.assertRaises(OSError):
+                    fid_array.save_to_file(filename, chunk_size=5)
+            self.assertEqual(os.listdir(tmpdir), ['project.nmrpy'])
+            loaded = FidArray.from_path(filename)
+            self.assertTrue(numpy.array_equal(loaded.data, saved))
+            fid_array.save_to_file(filename, chunk_size=5)
+            self.assertEqual(os.listdir(tmpdir), ['project.nmrpy'])
+            self.assertTrue(numpy.array_equal(FidArray.from_path(filename).data, fid_array.data))
+
+    def test_watch(self):
+        path_bruker = os.path.join(testpath, 'test_data', 'bruker1')
+        with tempfile.TemporaryDirectory() as tmpdir:
+            shutil.copytree(path_bruker, os.path.join(tmpdir, '1'))
+            fid_array = FidArray.from_paths(os.path.join(tmpdir, '1'))
+            fid_array.get_fids()[0].peaks = [4.71]
+            shutil.copytree(path_bruker, os.path.join(tmpdir, '2'))
+            os.mkdir(os.path.join(tmpdir, 'not_an_experiment'))
+            steps = [('ft', {}), ('real', {})]
+            fids = list(fid_array.watch(tmpdir, steps=steps, interval=0.01, timeout=0.2))
+            self.assertEqual(len(fids), 1)
+            self.assertEqual([fid.id for fid in fid_array.get_fids()], ['fid0', 'fid1'])
+            fid = fid_array.get_fids()[1]
+            self.assertIs(fid, fids[0])
+            self.assertTrue(fid._flags['ft'])
+            self.assertFalse(fid.data.dtype in fid._complex_dtypes)
+            self.assertTrue(numpy.array_equal(fid.peaks, [4.71]))
+            self.assertEqual(fid.fid_path, os.path.join(tmpdir, '2'))
+        with self.assertRaises(AttributeError):
+            next(fid_array.watch(testpath, steps=[('not_a_method', {})]))
+
+    def test_append_fid_stable_ids(self):
+        path_bruker = os.path.join(testpath, 'test_data', 'bruker1')
+        importer = FidArray._import_path(path_bruker, None)
+        fid_array = FidArray.from_paths(path_bruker)
+        first = fid_array.get_fids()[0]
+        capacities = set()
+        for i in range(11):
+            fid = fid_array._append_fid(importer.data[0], importer)
+            fid_array._extend_data_block(fid)
+            capacities.add(id(fid_array._data_capacity))
+        ids = [fid.id for fid in fid_array.get_fids()]
+        self.assertEqual(ids, ['fid{}'.format(i) for i in range(12)])
+        self.assertEqual(first.id, 'fid0')
+        self.assertIs(fid_array.fid0, first)
+        self.assertTrue(numpy.array_equal(fid_array.source_indices, numpy.arange(12)))
+        # the block grows by doubling rather than being rebuilt on every append
+        self.assertEqual(len(capacities), 4)
+        self.assertEqual(len(fid_array._data_capacity), 16)
+        self.assertTrue(fid_array._data_block_is_current(fid_array.get_fids()))
+        self.assertTrue(numpy.array_equal(fid_array.data[-1], importer.data[0]))
+
+    def test_stage_cache(self):
+        path_varian = os.path.join(testpath, 'test_data', 'test1.fid')
+        with tempfile.TemporaryDirectory() as tmpdir:
+            results = []
+            for run in range(2):
+                fid_array = FidArray.from_path(fid_path=path_varian, indices=slice(0, 3))
+                fid_array.enable_cache(tmpdir)
+                for fid in fid_array.get_fids():
+                    fid.peaks = [4.71, 4.64]
+                    fid.ranges = [[5.29, 3.67]]
+                fid_array.ft_fids()
+                fid_array.phase_correct_fids(mp=False)
+                fid_array.real_fids()
+                fid_array.deconv_fids(mp=False)
+                results.append(fid_array)
+                if run == 0:
+                    self.assertEqual(len(os.listdir(tmpdir)), 3)
+                    fid_array.disable_cache()
+                    self.assertIsNone(fid_array._stage_cache)
+            first, second = results
+            self.assertEqual(len(os.listdir(tmpdir)), 3)
+            self.assertTrue(numpy.array_equal(first.data, second.data))
+            self.assertTrue(all(fid._flags['ft'] for fid in second.get_fids()))
+            self.assertTrue(numpy.array_equal(first.deconvoluted_integrals, second.deconvoluted_integrals))
+            # different stage parameters are not restored
+            third = FidArray.from_path(fid_path=path_varian, indices=slice(0, 3))
+            third.enable_cache(tmpdir)
+            third.ft_fids()
+            third.phase_correct_fids(method='nelder', mp=False)
+            self.assertEqual(len(os.listdir(tmpdir)), 4)
+            # the cache is kept within max_size
+            third.enable_cache(tmpdir, max_size=1)
+            third.real_fids()
+            third.baseline_correct_fids()
+            self.assertEqual(len(os.listdir(tmpdir)), 0)
+
+    def test_baseline_correct_fids_batched(self):
+        path_varian = os.path.join(testpath, 'test_data', 'test1.fid')
+        fid_array = FidArray.from_path(fid_path=path_varian, indices=slice(0, 4))
+        fid_array.ft_fids()
+        fid_array.real_fids()
+        bl_ppm = numpy.linspace(9.0, -1.0, 200)
+        for fid in fid_array.get_fids():
+            fid._bl_ppm = bl_ppm
+        expected = []
+        for fid in fid_array.get_fids():
+            data = fid.data
+            x = numpy.arange(len(data))
+            m = numpy.ones_like(x)
+            m[fid._bl_indices] = 0
+            p = numpy.ma.polyfit(numpy.ma.masked_array(x, m), numpy.ma.masked_array(data, m), 3)
+            expected.append(data-numpy.polyval(p, x))
+        block = fid_array.data
+        fid_array.baseline_correct_fids(deg=3)
+        self.assertIs(fid_array.data, block)
+        self.assertTrue(numpy.allclose(fid_array.data, expected))
+        self.assertTrue(all(len(fid._bl_poly) == block.shape[1] for fid in fid_array.get_fids()))
+        # single-precision arrays are kept at single precision
+        fid_array.precision = 'single'
+        fid_array.baseline_correct_fids(deg=3)
+        self.assertEqual(fid_array.data.dtype, numpy.float32)
+        self.assertTrue(all(fid.data.dtype == numpy.float32 for fid in fid_array.get_fids()))
+        # FIDs with differing baseline points are corrected individually
+        fids = fid_array.get_fids()
+        fids[0]._bl_ppm = bl_ppm[:100]
+        self.assertIsNone(FidArray._shared_bl_indices(fids))
+        self.assertTrue(numpy.array_equal(FidArray._shared_bl_indices(fids[1:]), fids[1]._bl_indices))
+
+    def test_baseline_correct_fids_als(self):
+        path_varian = os.path.join(testpath, 'test_data', 'test1.fid')
+        fid_array = FidArray.from_path(fid_path=path_varian, indices=slice(0, 3))
+        fid_array.ft_fids()
+        fid_array.phase_correct_fids(mp=False)
+        fid_array.real_fids()
+        fid = fid_array.get_fids()[0]
+        reference = Fid.from_data(fid.data)
+        reference.baseline_correct(method='als', lam=1e7)
+        # add a broad, wavy baseline to the spectra
+        size = fid_array.data.shape[1]
+        wave = fid_array.data.max()*0.05*numpy.sin(numpy.linspace(0, 3*numpy.pi, size))
+        for f in fid_array.get_fids():
+            f.data = f.data+wave
+        fid_array.baseline_correct_fids(method='als', lam=1e7)
+        # the added baseline is removed
+        self.assertTrue(numpy.allclose(fid._bl_poly-reference._bl_poly, wave, atol=1e-2*abs(wave).max()))
+        self.assertTrue(numpy.allclose(fid.data, reference.data, atol=1e-2*abs(wave).max()))
+        # single-precision arrays are kept at single precision
+        fid_array.precision = 'single'
+        fid_array.baseline_correct_fids(method='als', lam=1e7)
+        self.assertEqual(fid_array.data.dtype, numpy.float32)
+        self.assertTrue(all(f._bl_poly.dtype == numpy.float32 for f in fid_array.get_fids()))
+        self.assertEqual(Fid._als_baselines(fid_array.data, 1e7, 0.001, 10).dtype, numpy.float32)
+        for kwargs in [{'method': 'spline'}, {'method': 'als', 'p': 1.5}, {'method': 'als', 'lam': -1.0}]:
+            with self.assertRaises(ValueError):
+                fid_array.baseline_correct_fids(**kwargs)
+        # failures of the per-FID fallback are raised, not blamed on missing baseline points
+        complex_array = FidArray.from_path(fid_path=path_varian, indices=slice(0, 2))
+        with self.assertRaises(TypeError):
+            complex_array.baseline_correct_fids(method='als')
+
+    def test_auto_baseliner_fids(self):
+        path_varian = os.path.join(testpath, 'test_data', 'test1.fid')
+        fid_array = FidArray.from_path(fid_path=path_varian, indices=slice(0, 4))
+        with self.assertRaises(ValueError):
+            fid_array.auto_baseliner_fids()
+        fid_array.ft_fids()
+        fid_array.phase_correct_fids(mp=False)
+        fid_array.real_fids()
+        fid_array.auto_baseliner_fids()
+        fids = fid_array.get_fids()
+        bl_ppm = fids[0]._bl_ppm
+        self.assertTrue(0.5*len(fids[0].data) < len(bl_ppm) < len(fids[0].data))
+        self.assertTrue(all(numpy.array_equal(fid._bl_ppm, bl_ppm) for fid in fids))
+        # peaks are not selected as baseline
+        for peak in [4.17, 0.57]:
+            self.assertTrue(abs(bl_ppm-peak).min() > 0.01)
+        self.assertIsNotNone(FidArray._shared_bl_indices(fids))
+        fid_array.baseline_correct_fids()
+        self.assertTrue(all(len(fid._bl_poly) == len(fid.data) for fid in fids))
+        # points are selected for each FID separately
+        fid_array.auto_baseliner_fids(combined=False)
+        self.assertTrue(all(fid._bl_ppm is not None for fid in fids))
+        fids[0].auto_baseliner(width=0.05)
+        with self.assertRaises(ValueError):
+            fids[0].auto_baseliner(width=-1.0)
+
+    def test_batch_transforms_out(self):
+        path_varian = os.path.join(testpath, 'test_data', 'test1.fid')
+        fid_array = FidArray.from_path(fid_path=path_varian, indices=slice(0, 3))
+        expected = [fid.data.copy() for fid in fid_array.get_fids()]
+        block = fid_array.data
+        # by default, windows are applied in place
+        fid_array.emhz_fids(lb=5.0)
+        fid_array.ps_fids(p0=30.0, p1=10.0)
+        self.assertIs(fid_array.data, block)
+        for fid, data in zip(fid_array.get_fids(), expected):
+            data = numpy.exp(-numpy.pi*numpy.arange(len(data))*(5.0/fid._params['sw_hz']))*data
+            data = Fid._ps(data, p0=30.0, p1=10.0)
+            self.assertTrue(numpy.allclose(fid.data, data))
+            self.assertIn('data', fid._dirty)
+        # preallocated buffers become the data block
+        rows, size = block.shape
+        out = numpy.empty((rows, 2*size), dtype=block.dtype)
+        fid_array.zf_fids(out=out)
+        self.assertIs(fid_array.data, out)
+        self.assertTrue(numpy.array_equal(out[:, :size], block))
+        self.assertFalse(out[:, size:].any())
+        out = numpy.empty(out.shape, dtype=out.real.dtype)
+        fid_array.real_fids(out=out)
+        self.assertIs(fid_array.data, out)
+        self.assertTrue(numpy.array_equal(out[:, :size], block.real))
+        with self.assertRaises(ValueError):
+            fid_array.emhz_fids(out=numpy.empty((rows, size)))
+        with self.assertRaises(ValueError):
+            fid_array.zf_fids(out=numpy.empty((rows, 4*size), dtype=numpy.complex64))
+        fid = fid_array.get_fids()[0]
+        fid.data = fid.data[:100]
+        with self.assertRaises(ValueError):
+            fid_array.real_fids(out=out)
+
+    def test_process_fids(self):
+        path_varian = os.path.join(testpath, 'test_data', 'test1.fid')
+        stages = [
+            ('emhz', {'lb': 5.0}),
+            ('ft', {}),
+            ('ps', {'p0': 30.0, 'p1': 10.0}),
+            ('real', {}),
+            ('deconv', {}),
+            ]
+        pipeline = Pipeline(stages)
+        self.assertEqual(len(pipeline._fused_stages()), 4)
+        self.assertEqual(Pipeline.from_config(pipeline.to_config()).stages, pipeline.stages)
+        expected = FidArray.from_path(fid_path=path_varian, indices=slice(0, 3))
+        for fid in expected.get_fids():
+            fid.peaks = [4.71, 4.64]
+            fid.ranges = [[5.29, 3.67]]
+            fid.emhz(lb=5.0)
+            fid.ft()
+            fid.ps(p0=30.0, p1=10.0)
+            fid.real()
+            fid.deconv()
+        for mp in [False, True]:
+            fid_array = FidArray.from_path(fid_path=path_varian, indices=slice(0, 3))
+            for fid in fid_array.get_fids():
+                fid.peaks = [4.71, 4.64]
+                fid.ranges = [[5.29, 3.67]]
+            fid_array.process_fids(stages if mp else pipeline, mp=mp)
+            self.assertTrue(numpy.allclose(fid_array.data, expected.data))
+            self.assertTrue(fid_array._data_block_is_current(fid_array.get_fids()))
+            self.assertTrue(all(fid._flags['ft'] for fid in fid_array.get_fids()))
+            self.assertTrue(numpy.allclose(fid_array.deconvoluted_integrals, expected.deconvoluted_integrals))
+        # stages without keyword arguments use the defaults of the Fid methods
+        self.assertEqual(Pipeline._stage_arguments('emhz', {}), {'lb': 5.0})
+        self.assertEqual(Pipeline._stage_arguments('apodise', {'lb': 2.0}), {'window': 'exponential', 'lb': 2.0})
+        fid_array = FidArray.from_path(fid_path=path_varian, indices=slice(0, 3))
+        expected = FidArray.from_path(fid_path=path_varian, indices=slice(0, 3))
+        fid_array.process_fids(['emhz', 'ft', 'ps'], mp=False)
+        for fid in expected.get_fids():
+            fid.emhz()
+            fid.ft()
+            fid.ps()
+        self.assertTrue(numpy.allclose(fid_array.data, expected.data))
+        with self.assertRaises(ValueError):
+            Pipeline([('not_a_stage', {})])
+        with self.assertRaises(TypeError):
+            Pipeline([('emhz', {'not_a_kwarg': 1.0})])
+
     def test_phase_correct_fids(self):
         self.fid_array_varian.ft_fids()
         self.fid_array_varian.phase_correct_fids(mp=False)
 
     def test_phase_correct_fids_mp_nelder(self):
         self.fid_array_varian.ft_fids()
+        block = self.fid_array_varian.data
         self.fid_array_varian.phase_correct_fids(method='nelder')
+        # results are written back into the existing data block
+        self.assertIs(self.fid_array_varian.data, block)
+        self.assertTrue(all('data' in fid._dirty for fid in self.fid_array_varian.get_fids()))
 
     def test_failed_phase_correct_fids(self):
         with self.assertRaises(ValueError):